@@ -26,13 +26,19 @@
 #from __future__ import print_function
 
 import random, time, optparse, humanize
-import socket, sys, os, re, math, hashlib
-import functools, string
+import socket, sys, os, re, math
+import functools, string, traceback, mmap, fcntl, resource, collections
+import errno, bisect, struct, zlib
+import threading, cProfile
 
 from os import system
 from functools import partial
 from itertools import repeat
-from multiprocessing import Pool, freeze_support, Lock, Process, Manager
+from multiprocessing import Pool, freeze_support, Lock, Process, Pipe, Barrier
+from multiprocessing.connection import wait, Listener, Client
+from threading import BrokenBarrierError
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.sharedctypes import RawArray, RawValue
 
 #
 # Global constants
@@ -40,7 +46,23 @@ from multiprocessing import Pool, freeze_support, Lock, Process, Manager
 kibybytes = ['KiB', 'MiB', 'GiB', 'TiB', 'PiB', 'EiB']
 kilobytes = ['KB', 'MB', 'GB', 'TB', 'PB', 'EB']
 
-process_manager = Manager()
+#
+# Alignment of buffers, file offsets and block sizes required by direct I/O
+#
+direct_io_alignment = mmap.PAGESIZE
+
+#
+# Size of the chunks of the data pool, only the first part of each of them
+# is random when the data should be compressible
+#
+data_pool_chunk = 4096
+
+#
+# Memory access hints which can be given to the kernel for mapped files
+#
+madvise_hints = {name: getattr(mmap, "MADV_" + name.upper()) \
+                 for name in ['sequential', 'random', 'willneed'] \
+                 if hasattr(mmap, "MADV_" + name.upper())}
 
 
 #
@@ -58,9 +80,72 @@ linear_read_size_label = "LINEAR READ SIZE [b]"
 random_read_label = "RANDOM READ TIME [s]"
 random_read_size_label = "RANDOM READ SIZE [b]"
 delete_label = "DELETE"
+tree_create_label = "TREE CREATE TIME [s]"
+delete_rate_label = "DELETE [ops/s]"
+iteration_label = "ITERATION"
+mixed_label = "MIXED TIME [s]"
+mixed_size_label = "MIXED SIZE [b]"
+random_write_label = "RANDOM WRITE TIME [s]"
+random_write_size_label = "RANDOM WRITE SIZE [b]"
 
 __test_data_dir = "naive-bench-data"
+__manifest_path = __test_data_dir + "/.manifest"
 
+#
+# Dataset manifest starts with a header holding the file count, the
+# directory layout and the block size of the verification headers (0 if
+# the files were not verified), followed by the size and generation of
+# each file
+#
+manifest_magic = b'naivebmf'
+manifest_version = 2
+manifest_header = struct.Struct('<8sIQIIIIQ')
+manifest_entry = struct.Struct('<Qq')
+
+#
+# Operations measured by the metadata benchmark, in the order in which
+# they are executed on the empty files stored in 'metadata_dir_name'
+#
+metadata_operations = ['create', 'stat', 'open', 'rename', 'utime', 'unlink']
+metadata_dir_name = "metadata"
+renamed_file_suffix = ".renamed"
+
+#
+# Latency percentiles reported for each benchmark phase
+#
+latency_percentiles = [50.0, 90.0, 99.0, 99.9]
+latency_phase_labels = ["CREATE", "RANDOM WRITE", "WRITE", "LINEAR READ", \
+                        "RANDOM READ", "CREATE SYNC", "RANDOM WRITE SYNC", \
+                        "WRITE SYNC", "DELETE", "MIXED READ", "MIXED WRITE"] \
+                     + ["MD " + op.upper() for op in metadata_operations]
+page_faults_phase_labels = ["CREATE", "RANDOM WRITE", "WRITE", "LINEAR READ", \
+                            "RANDOM READ", "DELETE", "MIXED"]
+
+#
+# Number of operations sampled at once by the mixed workload benchmark and
+# the maximum number of files kept open by each of its tasks
+#
+mixed_batch_size = 1024
+mixed_open_files = 256
+
+#
+# The knee of the scaling sweep is the first worker count after which
+# adding workers improves the throughput by less than 'knee_gain_threshold'
+#
+knee_gain_threshold = 0.1
+
+#
+# Steady state is reached when the coefficient of variation of throughput
+# in 'steady_state_window' consecutive progress samples drops below
+# 'steady_state_cv'
+#
+steady_state_window = 5
+steady_state_cv = 0.1
+
+#
+# Monotonic clock used for timing individual operations
+#
+monotonic_ns = time.perf_counter_ns
 
 
 def get_random_file_size(filesize, dev):
@@ -74,11 +159,758 @@ def get_random_file_size(filesize, dev):
     return int( (max_range-min_range)*random.random() + min_range )
 
 
-def get_random_data(size):
+def allocate_buffer(size):
+    """
+    Allocate a page aligned buffer of specified size, which can be used
+    for direct I/O
+    """
+    return memoryview(mmap.mmap(-1, max(size, 1)))[:size]
+
+
+class DataPool(object):
+    """
+    Pregenerated data written by all benchmark tasks.
+
+    The pool is generated once in shared memory before the workers are
+    started. Each block is taken at a different offset of the pool, so the
+    written blocks are unique without generating data for each of them.
+    Only the first part of each chunk of the pool is random, to make the
+    data compressible with given ratio, and a part of the blocks is always
+    taken at the start of the pool, to make the data dedupable with given
+    ratio.
+    """
+
+    def __init__(self, size, max_blocksize, compress_ratio=1.0, \
+                 dedup_ratio=1.0):
+        self.size = max(size, 2 * max_blocksize)
+        self.max_blocksize = max_blocksize
+        self.compress_ratio = compress_ratio
+        self.dedup_ratio = dedup_ratio
+        self.generate()
+
+    def __getstate__(self):
+        #
+        # Only the parameters are sent to the agents, which generate their
+        # own pool
+        #
+        state = self.__dict__.copy()
+        del state['buffer']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.generate()
+
+    def generate(self):
+        """
+        Fill the pool, which is followed by a copy of its beginning so that
+        a block can be taken at any offset
+        """
+        self.buffer = allocate_buffer(self.size + self.max_blocksize)
+        random_size = max(1, round(data_pool_chunk / self.compress_ratio))
+        chunk_count = -(-self.size // data_pool_chunk)
+        random_data = memoryview(os.urandom(chunk_count * random_size))
+        for chunk in range(chunk_count):
+            start = chunk * data_pool_chunk
+            length = min(random_size, self.size - start)
+            self.buffer[start:start + length] = \
+                random_data[chunk*random_size:chunk*random_size + length]
+        self.buffer[self.size:] = self.buffer[:self.max_blocksize]
+
+        #
+        # Odd stride coprime with the pool size visits all offsets before
+        # repeating and never keeps the chunk boundaries of the pool
+        #
+        self.stride = int(self.size * 0.6180339887) | 1
+        while math.gcd(self.stride, self.size) != 1:
+            self.stride += 2
+
+    def block_source(self):
+        """
+        Returns function which takes the next block of given size from the
+        pool, starting at a random offset. With verification enabled, the
+        block is stamped with the header of the block at 'offset' of file
+        'file_id'.
+        """
+        pool = self.buffer
+        pool_size = self.size
+        stride = self.stride
+        duplicate_fraction = 1.0 - 1.0 / self.dedup_ratio
+        offset = random.Random().randrange(pool_size)
+        block_count = 0
+
+        #
+        # Direct I/O requires aligned buffers and verification writable
+        # blocks, so blocks are copied into a ring of staging buffers, one
+        # more than the requests in flight
+        #
+        stamp = block_verifier.stamp if block_verifier else None
+        staging_buffers = None
+        if options.direct or stamp:
+            staging_buffers = [allocate_buffer(self.max_blocksize) \
+                               for i in range(max(options.iodepth, 1) + 1)]
+        next_staging_buffer = 0
+
+        def next_block(size, file_id=0, file_offset=0, generation=0):
+            nonlocal offset, block_count, next_staging_buffer
+            block_count += 1
+            if (block_count * 0.6180339887) % 1.0 < duplicate_fraction:
+                block = pool[:size]
+            else:
+                offset = (offset + stride) % pool_size
+                block = pool[offset:offset + size]
+            if staging_buffers:
+                staging_buffer = staging_buffers[next_staging_buffer][:size]
+                next_staging_buffer = \
+                    (next_staging_buffer + 1) % len(staging_buffers)
+                staging_buffer[:] = block
+                if stamp:
+                    stamp(staging_buffer, file_id, file_offset, generation)
+                return staging_buffer
+            return block
+
+        return next_block
+
+
+class VerificationError(Exception):
+    """
+    Data read from a benchmark file does not match the written data
+    """
+
+
+class BlockVerifier(object):
+    """
+    Stamps written blocks with a header identifying their data and checks
+    the header when the blocks are read.
+
+    The header holds the file id, block index and generation of the block
+    and the checksum of the rest of the block. Generation of each file is
+    kept in shared memory and incremented whenever the whole file is
+    written, so stale data returned by the storage is detected as well as
+    corrupted data. Generation 0 accepts data of any generation (files
+    written by a previous run), files partially overwritten by the mixed
+    benchmark are not verified until they are written again.
+    """
+
+    header = struct.Struct('<8sQQQI')
+    magic = b'naivebch'
+
+    def __init__(self, filecount, blocksize):
+        self.filecount = filecount
+        self.blocksize = blocksize
+        self.generations = RawArray('q', filecount)
+
+    def __getstate__(self):
+        #
+        # Agents start with their own generations
+        #
+        return (self.filecount, self.blocksize)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def start_write(self, file_id):
+        """
+        Returns the generation of the data written to the whole file
+        """
+        return max(self.generations[file_id], 0) + 1
+
+    def end_write(self, file_id, generation):
+        self.generations[file_id] = generation
+
+    def invalidate(self, file_id):
+        """
+        Stop verifying the file after a partial block was written to it
+        """
+        self.generations[file_id] = -1
+
+    def stamp(self, block, file_id, offset, generation):
+        """
+        Write the header of the block at 'offset' of the file into the block
+        """
+        header = BlockVerifier.header
+        if len(block) >= header.size:
+            header.pack_into(block, 0, BlockVerifier.magic, file_id, \
+                             offset // self.blocksize, generation, \
+                             zlib.crc32(block[header.size:]))
+
+    def check(self, record_verify, file_id, buffer, offset, size):
+        """
+        Check the header of the block of 'size' bytes read from 'offset'
+        of the file into 'buffer', recording the verification time
+        """
+        header = BlockVerifier.header
+        expected_generation = self.generations[file_id]
+        if size < header.size or expected_generation < 0:
+            return
+        op_start = monotonic_ns()
+        magic, block_file_id, block_index, generation, checksum = \
+                                                header.unpack_from(buffer)
+        if magic != BlockVerifier.magic or block_file_id != file_id \
+                or block_index != offset // self.blocksize \
+                or (expected_generation and generation != expected_generation) \
+                or checksum != zlib.crc32(buffer[header.size:size]):
+            if magic != BlockVerifier.magic:
+                found = "no block header"
+            else:
+                found = "file %d, block %d, generation %d, checksum %s" \
+                    % (block_file_id, block_index, generation, \
+                       "ok" if checksum == zlib.crc32(buffer[header.size:size]) \
+                       else "mismatch")
+            raise VerificationError(\
+                "Verification of block %d of file %d (generation %d) failed" \
+                ": found %s" % (offset // self.blocksize, file_id, \
+                                expected_generation, found))
+        record_verify(monotonic_ns() - op_start)
+
+
+def full_blocks_size(size, blocksize):
+    """
+    Returns the size of the part of the file accessed in full blocks by
+    linear benchmarks, the remainder is always in range (0, blocksize]
+    """
+    if size <= 0:
+        return 0
+    return ((size - 1) // blocksize) * blocksize
+
+
+def align_size(size):
+    """
+    Round the size up to the direct I/O alignment
+    """
+    return -(-size // direct_io_alignment) * direct_io_alignment
+
+
+def open_file(path, flags):
+    """
+    Open benchmark file descriptor, bypassing the page cache if direct I/O
+    was requested and using synchronous writes if requested
+    """
+    if options.direct:
+        flags |= os.O_DIRECT
+    if flags & (os.O_WRONLY | os.O_RDWR):
+        if options.opensync == 'osync':
+            flags |= os.O_SYNC
+        elif options.opensync == 'odsync':
+            flags |= os.O_DSYNC
+    return os.open(path, flags, 0o644)
+
+
+def get_sync_function():
+    """
+    Returns the function used to flush written data to stable storage
+    """
+    if options.syncmethod == 'fdatasync' and hasattr(os, 'fdatasync'):
+        return os.fdatasync
+    return os.fsync
+
+
+def timed_sync(benchmark_file, record_sync):
+    """
+    Flush file to stable storage recording the sync latency
+    """
+    op_start = monotonic_ns()
+    benchmark_file.sync()
+    record_sync(monotonic_ns() - op_start)
+
+
+def sync_files(test_data_dir, file_ids, record_sync):
+    """
+    Flush all files written by a task at the end of a benchmark phase
+    """
+    if options.engine == 'null':
+        return
+    sync_function = get_sync_function()
+    for file_id in file_ids:
+        fd = os.open(directory_layout.file_path(test_data_dir, file_id), \
+                     os.O_WRONLY)
+        op_start = monotonic_ns()
+        sync_function(fd)
+        record_sync(monotonic_ns() - op_start)
+        os.close(fd)
+
+
+#
+# State of the benchmark task running in the current thread
+#
+task_state = threading.local()
+
+
+def get_thread_resource_usage():
+    """
+    Returns the resource usage of the calling thread
+    """
+    usage = resource.getrusage(resource.RUSAGE_THREAD)
+    return (usage.ru_minflt, usage.ru_majflt, usage.ru_utime, usage.ru_stime,
+            usage.ru_nvcsw, usage.ru_nivcsw)
+
+
+def get_resource_usage():
+    """
+    Returns the number of minor and major page faults, user and system CPU
+    time and the number of voluntary and involuntary context switches of
+    the current benchmark task. Thread workers add the usage of the
+    executor threads of their I/O depth queue.
+    """
+    if options.workertype == 'thread':
+        usage = get_thread_resource_usage()
+        io_queue = getattr(task_state, 'io_queue', None)
+        if io_queue:
+            usage = tuple(map(sum, zip(usage, io_queue.usage)))
+        return usage
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return (usage.ru_minflt, usage.ru_majflt, usage.ru_utime, usage.ru_stime,
+            usage.ru_nvcsw, usage.ru_nivcsw)
+
+
+def parse_cpu_list(cpu_list_string):
+    """
+    Parse list of CPUs in the format of taskset, e.g. '0-3,8'
+    """
+    cpus = []
+    for cpu_range in cpu_list_string.split(','):
+        first, _, last = cpu_range.partition('-')
+        cpus.extend(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def pin_worker(task_id, cpus):
+    """
+    Pin the calling benchmark worker to a single CPU of the list
+    """
+    os.sched_setaffinity(0, [cpus[task_id % len(cpus)]])
+
+
+class PsyncFile(object):
+    """
+    Benchmark file accessed with pread/pwrite system calls.
+
+    Blocks are written with 'write_block(data, offset)' and read into
+    preallocated buffers with 'read_block(buffers, offset)'.
+    """
+
+    def __init__(self, path, flags, size):
+        self.fd = open_file(path, flags)
+        self.write_block = partial(os.pwrite, self.fd)
+        self.read_block = partial(os.preadv, self.fd)
+
+    def write_tail(self, data, offset):
+        """
+        Write the remainder of the file at 'offset'. Direct I/O requires
+        aligned sizes, so unaligned remainder is written with O_DIRECT
+        disabled on the file, which is restored afterwards for files
+        which stay open for further requests.
+        """
+        if options.direct and len(data) % direct_io_alignment:
+            flags = fcntl.fcntl(self.fd, fcntl.F_GETFL)
+            fcntl.fcntl(self.fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+            try:
+                return os.pwrite(self.fd, data, offset)
+            finally:
+                fcntl.fcntl(self.fd, fcntl.F_SETFL, flags)
+        return os.pwrite(self.fd, data, offset)
+
+    def read_tail(self, buffer, size, offset):
+        """
+        Read the remainder of the file at 'offset'. With direct I/O the
+        request is rounded up to the alignment and the kernel returns
+        a short read at end of file.
+        """
+        if options.direct:
+            size = align_size(size)
+        if size < len(buffer):
+            buffer = buffer[:size]
+        return os.preadv(self.fd, [buffer], offset)
+
+    def sync(self):
+        get_sync_function()(self.fd)
+
+    def truncate(self):
+        os.ftruncate(self.fd, 0)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class MmapFile(object):
+    """
+    Benchmark file mapped into memory, blocks are copied to and from
+    the mapping through memoryviews.
+    """
+
+    def __init__(self, path, flags, size):
+        writable = bool(flags & (os.O_WRONLY | os.O_RDWR))
+        if writable:
+            #
+            # Shared writable mappings require the file to be opened
+            # for reading and writing
+            #
+            flags = (flags & ~os.O_WRONLY) | os.O_RDWR
+        self.fd = open_file(path, flags)
+        self.size = size
+        self.mapping = None
+        self.view = None
+        if writable:
+            os.ftruncate(self.fd, size)
+        if size > 0:
+            self.mapping = mmap.mmap(self.fd, size, \
+                access=mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ)
+            if options.madvise != 'none':
+                self.mapping.madvise(madvise_hints[options.madvise])
+            self.view = memoryview(self.mapping)
+
+    def write_block(self, data, offset):
+        size = len(data)
+        self.view[offset:offset+size] = data
+        return size
+
+    def read_block(self, buffers, offset):
+        buffer = buffers[0]
+        size = min(len(buffer), self.size - offset)
+        buffer[:size] = self.view[offset:offset+size]
+        return size
+
+    def write_tail(self, data, offset):
+        if len(data) == 0:
+            return 0
+        return self.write_block(data, offset)
+
+    def read_tail(self, buffer, size, offset):
+        if size == 0:
+            return 0
+        return self.read_block([buffer], offset)
+
+    def sync(self):
+        if self.mapping is not None:
+            self.mapping.flush()
+
+    def unmap(self):
+        if self.mapping is not None:
+            self.view.release()
+            self.mapping.close()
+            self.mapping = None
+
+    def truncate(self):
+        self.unmap()
+        os.ftruncate(self.fd, 0)
+
+    def close(self):
+        self.unmap()
+        os.close(self.fd)
+
+
+class NullFile(object):
+    """
+    Benchmark file which does not exist, blocks are neither written nor
+    read. Used to measure the overhead of the benchmark itself.
+    """
+
+    def __init__(self, path, flags, size):
+        self.size = size
+
+    def write_block(self, data, offset):
+        return len(data)
+
+    def read_block(self, buffers, offset):
+        return min(len(buffers[0]), self.size - offset)
+
+    def write_tail(self, data, offset):
+        return len(data)
+
+    def read_tail(self, buffer, size, offset):
+        return size
+
+    def sync(self):
+        pass
+
+    def truncate(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def timed_call(function, data, offset, scheduled_start=None):
+    """
+    Call block I/O function returning its result and latency, which is
+    measured from 'scheduled_start' for requests issued at a target rate
+    """
+    op_start = monotonic_ns() if scheduled_start is None else scheduled_start
+    result = function(data, offset)
+    return result, monotonic_ns() - op_start
+
+
+class IoDepthQueue(object):
+    """
+    Keeps up to 'iodepth' block requests of a single task in flight using
+    a thread pool.
+
+    Requests are completed in submission order, the latency of each request
+    is measured in the thread which executes it and recorded by the task
+    when the request is completed. With 'pace' function, requests are
+    submitted at their scheduled start and their latency is measured from it.
+
+    Resource usage of a thread worker covers only its own thread, so with
+    thread workers the executor threads accumulate the resource usage of
+    the requests in 'usage', which is added to the usage of the task.
+    """
+
+    def __init__(self, iodepth, record_latency, blocksize, pace=None):
+        self.iodepth = iodepth
+        self.record_latency = record_latency
+        self.pace = pace
+        self.executor = ThreadPoolExecutor(max_workers=iodepth)
+        self.pending = collections.deque()
+        self.call = timed_call
+        if options.workertype == 'thread':
+            self.usage = (0, 0, 0.0, 0.0, 0, 0)
+            self.usage_lock = threading.Lock()
+            self.call = self.accounted_call
+            task_state.io_queue = self
+        #
+        # Each request in flight needs its own read buffer
+        #
+        self.read_buffers = [[allocate_buffer(blocksize)] \
+                             for i in range(iodepth)]
+        self.next_read_buffer = 0
+
+    def complete(self):
+        """
+        Wait for the oldest request and return the number of bytes
+        """
+        future, on_complete = self.pending.popleft()
+        result, latency = future.result()
+        self.record_latency(latency)
+        if on_complete:
+            on_complete(result)
+        return result
+
+    def submit(self, function, data, offset, on_complete=None):
+        """
+        Submit a block request, returns the number of bytes of requests
+        completed to make room for it. 'on_complete' is called with the
+        result of the request when it is completed.
+        """
+        scheduled_start = self.pace() if self.pace else None
+        completed_bytes = 0
+        if len(self.pending) >= self.iodepth:
+            completed_bytes = self.complete()
+        self.pending.append(\
+            (self.executor.submit(self.call, function, data, offset, \
+                                  scheduled_start), \
+             on_complete))
+        return completed_bytes
+
+    def accounted_call(self, function, data, offset, scheduled_start=None):
+        """
+        Timed call of block I/O function adding the resource usage of the
+        executor thread to the usage of the queue
+        """
+        usage_start = get_thread_resource_usage()
+        result = timed_call(function, data, offset, scheduled_start)
+        usage_end = get_thread_resource_usage()
+        with self.usage_lock:
+            self.usage = tuple(total + end - start for total, start, end \
+                               in zip(self.usage, usage_start, usage_end))
+        return result
+
+    def submit_read(self, function, offset, verify_block=None):
+        """
+        Submit a block read request into the next free read buffer,
+        the completed block is passed to 'verify_block' if given
+        """
+        buffers = self.read_buffers[self.next_read_buffer]
+        self.next_read_buffer = (self.next_read_buffer + 1) % self.iodepth
+        on_complete = None
+        if verify_block:
+            on_complete = partial(verify_block, buffers[0], offset)
+        return self.submit(function, buffers, offset, on_complete)
+
+    def drain(self):
+        """
+        Wait for all outstanding requests and return the number of bytes
+        """
+        completed_bytes = 0
+        while self.pending:
+            completed_bytes += self.complete()
+        return completed_bytes
+
+    def close(self):
+        self.executor.shutdown()
+
+
+def new_io_queue(record_latency, blocksize, pace=None):
+    """
+    Create I/O depth queue for a benchmark task, or None if requests are
+    issued synchronously one at a time
+    """
+    if options.iodepth <= 1:
+        return None
+    return IoDepthQueue(options.iodepth, record_latency, blocksize, \
+                        pace if task_rate.value > 0 else None)
+
+
+def set_task_rate(rate):
+    """
+    Set the target rate of block requests of each benchmark task of the
+    node, 0 issues requests as fast as possible
+    """
+    task_rate.value = rate
+
+
+def new_pacer():
+    """
+    Returns function which returns the start time of the next block request
+    of a benchmark task.
+
+    With a target rate, requests are scheduled on a fixed timetable starting
+    with the first request. The function waits for the scheduled start and
+    returns it, so that requests delayed by a slow request are measured from
+    their scheduled start and their latency is not omitted (coordinated
+    omission).
+    """
+    rate = task_rate.value
+    if rate <= 0:
+        return monotonic_ns
+    interval = 1e9 / rate
+    first_start = None
+    request_count = 0
+
+    def pace():
+        nonlocal first_start, request_count
+        now = monotonic_ns()
+        if first_start is None:
+            first_start = now
+        scheduled_start = first_start + int(request_count * interval)
+        request_count += 1
+        if scheduled_start > now:
+            time.sleep((scheduled_start - now) / 1e9)
+        return scheduled_start
+
+    return pace
+
+
+def parse_rate(rate_string, blocksize):
+    """
+    Parse target rate given in requests per second or in bytes per second
+    with a size suffix (e.g. 100MB), returns requests per second
+    """
+    try:
+        return float(rate_string)
+    except ValueError:
+        return parse_file_size(rate_string) / blocksize
+
+
+#
+# Available block I/O engines, 'null' engine is used only to calibrate
+# the benchmark
+#
+file_engines = {'psync': PsyncFile, 'mmap': MmapFile, 'null': NullFile}
+
+
+def open_benchmark_file(path, flags, size):
+    """
+    Open benchmark file of specified size using the selected I/O engine
+    """
+    return file_engines[options.engine](path, flags, size)
+
+
+def random_permutation(count, rng=random):
+    """
+    Lazily generate a pseudo-random permutation of integers in [0, count)
+    using constant memory.
+
+    A full period linear congruential generator modulo the smallest power
+    of 2 not less than 'count' visits every value of the domain exactly
+    once. Its output is scrambled with an odd multiplier and a xorshift,
+    which are both bijections on the domain, and values outside of the
+    range are skipped.
+    """
+    if count <= 0:
+        return
+    bits = max(2, (count - 1).bit_length())
+    mask = (1 << bits) - 1
+    shift = bits // 2
+    #
+    # Hull-Dobell theorem - the increment must be odd and the multiplier
+    # must be congruent to 1 modulo 4
+    #
+    multiplier = (rng.getrandbits(bits) & ~3) | 1
+    increment = rng.getrandbits(bits) | 1
+    scramble = rng.getrandbits(bits) | 1
+    state = rng.getrandbits(bits)
+    for _ in range(mask + 1):
+        state = (state * multiplier + increment) & mask
+        value = (state * scramble) & mask
+        value ^= value >> shift
+        if value < count:
+            yield value
+
+
+class AccessDistribution(object):
+    """
+    Distribution of accesses over 'count' items (blocks of the dataset).
+
+    Items are drawn in batches by mapping uniform random numbers through
+    the inverse cumulative distribution function:
+      * uniform - all items are equally likely,
+      * zipf - item of rank 'r' is accessed with probability proportional
+        to 1/r^theta (continuous approximation),
+      * hotspot - 'hot_access' fraction of accesses goes to 'hot_data'
+        fraction of the items.
+    Ranks are spread over the items with a multiplicative hash, so that the
+    hot items are not clustered at the beginning of the dataset.
+    """
+
+    def __init__(self, kind, count, theta=1.0, hot_data=0.2, hot_access=0.8):
+        self.kind = kind
+        self.count = count
+        self.theta = theta
+        self.hot_count = max(1, int(count * hot_data))
+        self.hot_access = hot_access
+        self.multiplier = 2654435761
+        while math.gcd(self.multiplier, count) != 1:
+            self.multiplier += 2
+
+    def sample(self, k, rng=random):
+        """
+        Returns a batch of 'k' item indexes
+        """
+        count = self.count
+        uniform = [rng.random() for i in range(k)]
+        if self.kind == 'zipf':
+            if self.theta == 1.0:
+                ranks = [int((count + 1.0) ** u) - 1 for u in uniform]
+            else:
+                exponent = 1.0 - self.theta
+                scale = (count + 1.0) ** exponent - 1.0
+                ranks = [int((1.0 + u * scale) ** (1.0 / exponent)) - 1 \
+                         for u in uniform]
+        elif self.kind == 'hotspot':
+            hot_count, hot_access = self.hot_count, self.hot_access
+            cold_count = count - hot_count
+            ranks = [int(u / hot_access * hot_count) if u < hot_access else \
+                     hot_count + int((u - hot_access) / (1.0 - hot_access) \
+                                     * cold_count) \
+                     for u in uniform]
+        else:
+            return [int(u * count) for u in uniform]
+        multiplier = self.multiplier
+        return [(min(r, count - 1) * multiplier) % count for r in ranks]
+
+
+def parse_block_size_distribution(distribution_string):
     """
-    Create a an array of specified size filled with a random bytes
+    Parses a list of block sizes with optional weights, e.g. '4KiB:70,1MiB:30'
+    into a list of sizes and a list of weights
     """
-    return bytearray(os.urandom(size))
+    sizes = []
+    weights = []
+    for entry in distribution_string.split(','):
+        size, _, weight = entry.partition(':')
+        sizes.append(parse_file_size(size.strip()))
+        weights.append(float(weight) if weight else 1.0)
+    return sizes, weights
 
 
 def parse_file_size(file_size_string):
@@ -116,209 +948,1602 @@ def parse_file_size(file_size_string):
 def init_child_process(write_lock):
     """
     """
-
-    pass
+
+    pass
+
+
+def drop_caches():
+    """
+    Drops file cache
+    """
+
+    cmd = ""
+    if sys.platform == "linux" or sys.platform == "linux2":
+        cmd = "sudo sh -c 'sync ; echo 3 > /proc/sys/vm/drop_caches'"
+    elif sys.platform == "darwin":
+        cmd = "sudo sh -c 'sync; purge'"
+    else:
+        print ( sys.platform, " platform is not supported - exiting." )
+        sys.exit(1)
+
+    system(cmd)
+
+
+def evict_caches(pool, filecount):
+    """
+    Clear the cache before the next benchmark phase, either dropping the
+    whole page cache of each node or evicting only the test files
+    """
+    if options.evict == 'fadvise':
+        pool.start(file_evict_benchmark, \
+                   [(0, __test_data_dir)] * pool.threadcount, filecount)
+        results = pool.wait_results()
+        if any(isinstance(result, BenchmarkError) for result in results):
+            pool.fail(results)
+    else:
+        pool.call(drop_caches)
+
+
+def format_progress_message(name, progress, total, suffix, width=40, \
+                            numtype='numeric'):
+    """
+    Formats the progress
+    """
+    if numtype == 'normal':
+        p = int((progress*width)/total)
+        percentage = int((progress*100)/total)
+        return name + (" [%-40s] %d%%" % ('='*p, percentage)) + ", " \
+            + str(progress)  + " of "\
+            + str(total)  \
+            + " | " \
+            + suffix + "        "
+    elif numtype == 'filesize':
+        p = int((progress*width)/total)
+        percentage = int((progress*100)/total)
+        return name + (" [%-40s] %d%%" % ('='*p, percentage)) + ", " \
+            + humanize.naturalsize(progress)  + " of "\
+            + humanize.naturalsize(total)  \
+            + " | " \
+            + suffix + "        "
+
+
+class LatencyHistogram(object):
+    """
+    Compact log-bucketed (HDR-style) histogram of latencies in nanoseconds.
+
+    Values below 128 are stored exactly, larger values are stored in 64
+    linear sub-buckets per power of 2, which bounds the relative error
+    of reported percentiles by 1/64 (about 1.6%).
+    """
+
+    sub_bucket_bits = 7
+    bucket_count = ((64 - sub_bucket_bits) << (sub_bucket_bits - 1)) \
+                   + (1 << sub_bucket_bits)
+
+    def __init__(self):
+        self.counts = [0] * LatencyHistogram.bucket_count
+        self.max = 0
+
+    def record(self, value):
+        """
+        Record a single latency value (in nanoseconds)
+        """
+        if value < 128:
+            self.counts[value] += 1
+        else:
+            shift = value.bit_length() - 7
+            self.counts[(shift << 6) + (value >> shift)] += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Add all values recorded in 'other' histogram to this histogram
+        """
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        if other.max > self.max:
+            self.max = other.max
+        return self
+
+    def total_count(self):
+        """
+        Return the number of recorded values
+        """
+        return sum(self.counts)
+
+    def reset(self):
+        """
+        Discard all recorded values
+        """
+        self.counts = [0] * LatencyHistogram.bucket_count
+        self.max = 0
+
+    @staticmethod
+    def bucket_highest_value(index):
+        """
+        Return the highest value which is stored in bucket 'index'
+        """
+        if index < 128:
+            return index
+        shift = (index >> 6) - 1
+        return ((index - (shift << 6) + 1) << shift) - 1
+
+    def total_value(self):
+        """
+        Return the approximate sum of recorded values
+        """
+        return sum(count * min(LatencyHistogram.bucket_highest_value(index),
+                               self.max)
+                   for index, count in enumerate(self.counts) if count)
+
+    def value_at_percentile(self, percentile):
+        """
+        Return the latency below which 'percentile' % of values fall
+        """
+        total = self.total_count()
+        if total == 0:
+            return float('NaN')
+        target = max(1, int(math.ceil(total * percentile / 100.0)))
+        cumulative = 0
+        for index, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return min(LatencyHistogram.bucket_highest_value(index),
+                           self.max)
+        return self.max
+
+    def __getstate__(self):
+        #
+        # Only send non empty buckets between processes
+        #
+        return ({i: c for i, c in enumerate(self.counts) if c}, self.max)
+
+    def __setstate__(self, state):
+        self.counts = [0] * LatencyHistogram.bucket_count
+        for index, count in state[0].items():
+            self.counts[index] = count
+        self.max = state[1]
+
+
+def new_latency_histograms(operations):
+    """
+    Create a dictionary of empty latency histograms for each operation type
+    """
+    return {op: LatencyHistogram() for op in operations}
+
+
+def merge_latency_histograms(threads_results):
+    """
+    Merge latency histograms returned by all benchmark tasks
+    """
+    merged = {}
+    for result in threads_results:
+        for op, histogram in result[2].items():
+            merged.setdefault(op, LatencyHistogram()).merge(histogram)
+    return merged
+
+
+def format_latency_summary(histograms):
+    """
+    Formats latency percentiles of each operation type in microseconds
+    """
+    lines = []
+    for op, histogram in sorted(histograms.items()):
+        if histogram.total_count() == 0:
+            continue
+        lines.append("--- LATENCY " + op.upper() + " [us]: " \
+            + ", ".join("p%g=%.1f" % (p, histogram.value_at_percentile(p)/1e3)
+                        for p in latency_percentiles) \
+            + ", max=%.1f" % (histogram.max/1e3) \
+            + " (" + str(histogram.total_count()) + " ops)")
+    return "\n".join(lines)
+
+
+def latency_csv_labels():
+    """
+    Returns the CSV column labels for latency percentiles of all phases
+    """
+    labels = []
+    for phase in latency_phase_labels:
+        for p in latency_percentiles:
+            labels.append(phase + " P%g [us]" % p)
+        labels.append(phase + " MAX [us]")
+    return labels
+
+
+def merge_page_faults(threads_results):
+    """
+    Sum minor and major page faults of all benchmark tasks
+    """
+    return tuple(sum(result[3][i] for result in threads_results) \
+                 for i in range(2))
+
+
+def format_verify_summary(histograms, read_bytes, threadcount):
+    """
+    Formats the number of verified blocks and the throughput at which all
+    tasks together verify the read data
+    """
+    histogram = histograms['verify']
+    verify_time = histogram.total_value() / 1e9 / threadcount
+    return "--- VERIFIED " + str(histogram.total_count()) + " BLOCKS," \
+        + " VERIFY THROUGHPUT: " \
+        + str(humanize.naturalsize(read_bytes / max(verify_time, 1e-9))) \
+        + "/s"
+
+
+def merge_cpu_usage(threads_results):
+    """
+    Sum user and system CPU time and voluntary and involuntary context
+    switches of all benchmark tasks
+    """
+    return tuple(sum(result[3][i] for result in threads_results) \
+                 for i in range(2, 6))
+
+
+def format_cpu_summary(cpu_usage, phase_bytes, phase_ops):
+    """
+    Formats the CPU time of a benchmark phase per GB of transferred data
+    and per operation
+    """
+    cpu_time = cpu_usage[0] + cpu_usage[1]
+    line = "--- CPU: %.3fs user, %.3fs sys" % cpu_usage[:2]
+    if phase_bytes > 0:
+        line += ", %.3f CPU-s/GB" % (cpu_time / (phase_bytes / 1e9))
+    if phase_ops > 0:
+        line += ", %.1f CPU-us/op" % (cpu_time / phase_ops * 1e6)
+    return line + ", %d voluntary, %d involuntary context switches" \
+           % cpu_usage[2:]
+
+
+def cpu_csv_labels():
+    """
+    Returns the CSV column labels for the CPU cost of all phases
+    """
+    labels = []
+    for phase in page_faults_phase_labels:
+        labels.append(phase + " CPU [s/GB]")
+        labels.append(phase + " CPU [us/op]")
+    return labels
+
+
+def cpu_csv_values(cpu_usage, phase_bytes, phase_ops):
+    """
+    Returns the CSV column values for the CPU cost of a single phase
+    """
+    if cpu_usage is None:
+        return [str(float('NaN'))] * 2
+    cpu_time = cpu_usage[0] + cpu_usage[1]
+    return [str(cpu_time / (phase_bytes / 1e9) if phase_bytes > 0 \
+                else float('NaN')),
+            str(cpu_time / phase_ops * 1e6 if phase_ops > 0 \
+                else float('NaN'))]
+
+
+def format_page_faults_summary(page_faults):
+    """
+    Formats the number of page faults of a benchmark phase
+    """
+    return "--- PAGE FAULTS: " + str(page_faults[0]) + " minor, " \
+        + str(page_faults[1]) + " major"
+
+
+def format_task_skew_summary(results):
+    """
+    Formats the distribution of files and completion times among the tasks
+    of a benchmark phase
+    """
+    end_times = [result[1] for result in results]
+    file_counts = [result[4] for result in results]
+    skew = 0.0
+    if max(end_times) > 0:
+        skew = 100.0 * (max(end_times) - min(end_times)) / max(end_times)
+    return "--- TASK SKEW: %d-%d files per task, finished in %.3f-%.3fs" \
+           " (%.1f%% spread)" % (min(file_counts), max(file_counts),
+                                 min(end_times), max(end_times), skew)
+
+
+def page_faults_csv_labels():
+    """
+    Returns the CSV column labels for page faults of all phases
+    """
+    labels = []
+    for phase in page_faults_phase_labels:
+        labels.append(phase + " MINOR FAULTS")
+        labels.append(phase + " MAJOR FAULTS")
+    return labels
+
+
+def latency_csv_values(histogram):
+    """
+    Returns the CSV column values for latency percentiles of a single phase
+    """
+    if histogram is None or histogram.total_count() == 0:
+        return [str(float('NaN'))] * (len(latency_percentiles) + 1)
+    return [str(histogram.value_at_percentile(p)/1e3) \
+            for p in latency_percentiles] + [str(histogram.max/1e3)]
+
+
+class ProgressCounters(object):
+    """
+    Per task progress counters kept in shared memory.
+
+    Benchmark tasks only store plain integers in these arrays, all
+    formatting and throughput calculations are done by the parent process.
+    """
+
+    def __init__(self, threadcount):
+        self.done_bytes = RawArray('q', threadcount)
+        self.done_ops = RawArray('q', threadcount)
+        self.total_bytes = RawArray('q', threadcount)
+
+    def reset(self):
+        """
+        Reset all counters before starting a new benchmark phase
+        """
+        for task_id in range(len(self.done_bytes)):
+            self.done_bytes[task_id] = 0
+            self.done_ops[task_id] = 0
+            self.total_bytes[task_id] = 0
+
+    def format_messages(self, elapsed_times, numtype='filesize'):
+        """
+        Formats progress messages of all tasks, based on the time elapsed
+        since the start of each task. Metadata benchmarks count operations
+        instead of bytes ('normal' numtype).
+        """
+        messages = []
+        for task_id in range(len(self.done_bytes)):
+            done_bytes = self.done_bytes[task_id]
+            total_bytes = self.total_bytes[task_id]
+            if total_bytes == 0:
+                messages.append("Starting task " + str(task_id))
+                continue
+            current_throughput = "???"
+            elapsed_time = elapsed_times[task_id]
+            if elapsed_time > 0:
+                current_throughput = \
+                    str(int(self.done_ops[task_id]/elapsed_time)) + " ops/s"
+                if numtype == 'filesize':
+                    current_throughput = \
+                        humanize.naturalsize(done_bytes/elapsed_time) \
+                        + "/s, " + current_throughput
+            messages.append(\
+                format_progress_message("Task #" + str(task_id),
+                                        done_bytes,
+                                        total_bytes,
+                                        current_throughput,
+                                        width=40, numtype=numtype))
+        return messages
+
+
+class DirectoryLayout(object):
+    """
+    Maps file ids to paths in a directory tree with given depth and fan-out
+    of each level.
+
+    In 'shared' layout all tasks use the same tree, in 'private' layout each
+    task has its own subtree holding the files it owns in the file queue.
+    Paths of the leaf directories are precomputed, so resolving a file path
+    is a single list lookup.
+    """
+
+    def __init__(self, depth=0, fanout=1, private=False, threadcount=1):
+        leaves = [""]
+        for level in range(depth):
+            leaves = [leaf + "d" + str(i) + "/" \
+                      for leaf in leaves for i in range(fanout)]
+        #
+        # Private leaf directories are interleaved, so that file 'id' lands
+        # in the subtree of task 'id % threadcount'
+        #
+        if private:
+            leaves = ["t" + str(task_id) + "/" + leaf \
+                      for leaf in leaves for task_id in range(threadcount)]
+        self.leaf_dirs = leaves
+        self.leaf_count = len(leaves)
+
+    def has_directories(self):
+        return self.leaf_dirs != [""]
+
+    def file_path(self, base_dir, file_id):
+        """
+        Returns the path of file 'file_id' in the tree rooted at 'base_dir'
+        """
+        return base_dir + "/" + self.leaf_dirs[file_id % self.leaf_count] \
+               + str(file_id)
+
+
+class FileQueue(object):
+    """
+    Shared queue of file ids of a benchmark phase.
+
+    File 'id' is owned by task 'id % threadcount'. Each task takes its own
+    files in increasing order and when it runs out of them, it steals files
+    from the end of the partition of the task with the most remaining files,
+    so that tasks which got smaller files do not stay idle until the slowest
+    task finishes. Phases can be limited to the first 'active' tasks, the
+    remaining tasks get no files.
+
+    With 'private' directory layout files are never stolen, as they are
+    stored in the subtree of their owner, and in phases with fewer active
+    tasks each active task takes over whole subtrees of the inactive ones.
+    """
+
+    def __init__(self, threadcount, workertype='process', private=False):
+        self.threadcount = threadcount
+        self.private = private
+        self.next_index = RawArray('q', threadcount)
+        self.end_index = RawArray('q', threadcount)
+        self.active = RawValue('q', threadcount)
+        self.runtime = RawValue('d', 0.0)
+        self.warmup = RawValue('d', 0.0)
+        if workertype == 'thread':
+            self.lock = threading.Lock()
+        else:
+            self.lock = Lock()
+
+    def reset(self, filecount, runtime=0.0, warmup=0.0, active=None):
+        """
+        Refill the queue with file ids in range [0, filecount) for 'active'
+        tasks (all by default). When 'runtime' is set, tasks cycle over
+        their files for 'warmup' plus 'runtime' seconds.
+        """
+        self.runtime.value = runtime
+        self.warmup.value = warmup
+        if active is None:
+            active = self.threadcount
+        self.active.value = active
+        for task_id in range(self.threadcount):
+            self.next_index[task_id] = 0
+            self.end_index[task_id] = 0
+            if task_id < active:
+                self.end_index[task_id] = \
+                    self.owned_count(filecount, task_id, active)
+
+    def owned_count(self, filecount, task_id, active):
+        """
+        Returns the number of files of the task
+        """
+        owners, group = self.owners(task_id, active)
+        return sum((filecount - owner + group - 1) // group \
+                   for owner in owners)
+
+    def owners(self, task_id, active):
+        """
+        Returns the partitions of files taken by the task, file 'id' is in
+        partition 'id % group' where group is 'threadcount' with private
+        layout and 'active' otherwise
+        """
+        group = self.threadcount if self.private else active
+        return range(task_id, group, active), group
+
+    def file_id(self, task_id, index, active):
+        """
+        Returns the id of the 'index'-th file of the task in increasing
+        order
+        """
+        owners, group = self.owners(task_id, active)
+        return owners[index % len(owners)] + (index // len(owners)) * group
+
+    def take(self, task_id):
+        """
+        Returns the next file id for the task or None if the queue is empty
+        """
+        next_index = self.next_index
+        end_index = self.end_index
+        active = self.active.value
+        if task_id >= active:
+            return None
+        with self.lock:
+            if next_index[task_id] < end_index[task_id]:
+                index = next_index[task_id]
+                next_index[task_id] = index + 1
+                return self.file_id(task_id, index, active)
+
+            if self.private:
+                return None
+            victim = max(range(active), \
+                         key=lambda t: end_index[t] - next_index[t])
+            if next_index[victim] >= end_index[victim]:
+                return None
+            end_index[victim] -= 1
+            return self.file_id(victim, end_index[victim], active)
+
+    def files(self, task_id, histograms=None, done_bytes=None):
+        """
+        Returns iterator over the files taken by the task, the runtime
+        and warmup start when it is created
+        """
+        return TaskFiles(self, task_id, histograms, done_bytes)
+
+
+class TaskFiles(object):
+    """
+    Iterator over the files taken by a benchmark task from the file queue.
+
+    In time-bounded phases the task cycles over its own partition until
+    the runtime elapses. Latencies recorded in 'histograms' before the
+    end of the warmup are discarded and the time, resource usage and
+    bytes done by the task ('done_bytes' progress counters) are measured
+    from that point. Benchmarks check 'expired()' after each block, so
+    that the runtime and warmup are enforced also in the middle of large
+    files.
+    """
+
+    def __init__(self, file_queue, task_id, histograms=None, done_bytes=None):
+        self.file_queue = file_queue
+        self.task_id = task_id
+        self.histograms = histograms
+        self.done_bytes = done_bytes
+        start_time = time.perf_counter()
+        self.start_time = start_time
+        self.usage_start = get_resource_usage()
+        self.bytes_start = 0
+        self.warmup_end = None
+        if file_queue.warmup.value > 0:
+            self.warmup_end = start_time + file_queue.warmup.value
+        self.deadline = None
+        if file_queue.runtime.value > 0:
+            self.deadline = start_time + file_queue.warmup.value \
+                            + file_queue.runtime.value
+        self.own_count = file_queue.end_index[task_id]
+        self.active = file_queue.active.value
+        self.index = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.deadline is None:
+            file_id = self.file_queue.take(self.task_id)
+            if file_id is None:
+                raise StopIteration
+        else:
+            if self.own_count == 0 or self.expired():
+                raise StopIteration
+            file_id = self.file_queue.file_id(self.task_id, \
+                            self.index % self.own_count, self.active)
+            self.index += 1
+        self.expired()
+        return file_id
+
+    def expired(self):
+        """
+        Returns True if the runtime of the phase elapsed. Latencies recorded
+        until the end of the warmup are discarded when it is reached.
+        """
+        if self.deadline is None and self.warmup_end is None:
+            return False
+        now = time.perf_counter()
+        if self.warmup_end is not None and now >= self.warmup_end:
+            if self.histograms:
+                for histogram in self.histograms.values():
+                    histogram.reset()
+            if self.done_bytes:
+                self.bytes_start = self.done_bytes[self.task_id]
+            self.start_time = now
+            self.usage_start = get_resource_usage()
+            self.warmup_end = None
+        return self.deadline is not None and now >= self.deadline
+
+    def measured(self, total_bytes):
+        """
+        Returns the bytes done, the elapsed time and the resource usage of
+        the task since the end of the warmup, given the total bytes done
+        """
+        return (total_bytes - self.bytes_start, \
+                time.perf_counter() - self.start_time, \
+                tuple(end - start for start, end in \
+                      zip(self.usage_start, get_resource_usage())))
+
+
+def benchmark_name(benchmark):
+    """
+    Returns the name of a benchmark function including the arguments bound
+    to it, e.g. 'file_metadata_benchmark-stat'
+    """
+    if isinstance(benchmark, partial):
+        return "-".join([benchmark.func.__name__] \
+                        + [str(arg) for arg in benchmark.args])
+    return benchmark.__name__
+
+
+def benchmark_worker(task_id, connection, progress_counters, start_barrier,
+                     file_queue, file_sizes):
+    """
+    Main loop of a long-lived benchmark worker process.
+
+    Receives benchmark phase descriptors from the parent process, runs the
+    benchmark and sends back its result, until 'None' is received. Sizes of
+    the test files are shared with the parent process and are not part of
+    the phase descriptors.
+
+    With profiling enabled, each benchmark is profiled and the statistics
+    of all its runs are written to '<benchmark>-<task id>.prof' after each
+    run.
+    """
+
+    if options.cpus:
+        pin_worker(task_id, options.cpus)
+
+    profiles = {}
+
+    while True:
+        phase = connection.recv()
+        if phase is None:
+            break
+
+        benchmark, args = phase
+        profile = None
+        if options.profile:
+            profile = profiles.setdefault(benchmark_name(benchmark), \
+                                          cProfile.Profile())
+            profile.enable()
+        try:
+            result = benchmark(task_id, file_sizes, *args,
+                               progress_counters=progress_counters,
+                               start_barrier=start_barrier,
+                               file_queue=file_queue)
+        except Exception:
+            #
+            # Make sure the other tasks and the parent do not wait forever
+            # on the start barrier
+            #
+            start_barrier.abort()
+            result = BenchmarkError(traceback.format_exc())
+        if profile:
+            profile.disable()
+            os.makedirs(options.profile, exist_ok=True)
+            profile.dump_stats(os.path.join(options.profile, "%s-%d.prof" \
+                               % (benchmark_name(benchmark), task_id)))
+        connection.send(result)
+
+    connection.close()
+
+
+class BenchmarkError(object):
+    """
+    Result of a benchmark task which failed with an exception
+    """
+
+    def __init__(self, message):
+        self.message = message
+
+
+class WorkerPool(object):
+    """
+    Pool of long-lived benchmark workers reused by all phases. Workers are
+    either separate processes or threads of the main process.
+    """
+
+    def __init__(self, threadcount, workertype='process', filecount=0):
+        self.threadcount = threadcount
+        self.nodecount = 1
+        self.progress_counters = ProgressCounters(threadcount)
+        self.file_queue = FileQueue(threadcount, workertype, \
+                                    options.dirlayout == 'private')
+        self.file_sizes = RawArray('q', filecount)
+
+        if workertype == 'thread':
+            worker_class, barrier_class = threading.Thread, threading.Barrier
+        else:
+            worker_class, barrier_class = Process, Barrier
+
+        #
+        # Initialize barrier lock to wait until the tasks initialize before
+        # starting time measurement, the barrier is reused by all phases
+        #
+        self.start_barrier = barrier_class(threadcount+1)
+
+        self.connections = []
+        self.workers = []
+        for task_id in range(threadcount):
+            parent_connection, child_connection = Pipe()
+            worker = worker_class(target=benchmark_worker, \
+                             args=(task_id, child_connection, \
+                                   self.progress_counters, self.start_barrier,
+                                   self.file_queue, self.file_sizes))
+            worker.daemon = True
+            worker.start()
+            if workertype != 'thread':
+                child_connection.close()
+            self.connections.append(parent_connection)
+            self.workers.append(worker)
+
+    def set_file_sizes(self, file_sizes):
+        """
+        Store the sizes of the test files in the array shared with the
+        workers, used by all following phases
+        """
+        self.file_sizes[:len(file_sizes)] = file_sizes
+
+    def submit(self, benchmark, benchmark_args, filecount, runtime=0.0, \
+               warmup=0.0, active=None):
+        """
+        Send the benchmark phase to all workers, only the first 'active'
+        workers get files
+        """
+        self.progress_counters.reset()
+        self.file_queue.reset(filecount, runtime, warmup, active)
+        for task_id in range(self.threadcount):
+            self.connections[task_id].send((benchmark, benchmark_args[task_id]))
+
+    def wait_ready(self):
+        """
+        Wait until all workers initialized the phase and wait on the start
+        barrier, or one of them failed
+        """
+        while self.start_barrier.n_waiting < self.threadcount \
+                and not self.start_barrier.broken:
+            time.sleep(0.001)
+
+    def release(self):
+        """
+        Release the workers waiting on the start barrier, returns False if
+        any of the workers failed
+        """
+        try:
+            self.start_barrier.wait()
+        except BrokenBarrierError:
+            return False
+        return True
+
+    def start(self, benchmark, benchmark_args, filecount, runtime=0.0, \
+              warmup=0.0, active=None):
+        """
+        Send the benchmark phase to all workers and wait until they are ready
+        """
+        self.submit(benchmark, benchmark_args, filecount, runtime, warmup, \
+                    active)
+        if not self.release():
+            self.fail(self.wait_results())
+
+    def call(self, function, *args):
+        """
+        Call 'function' on each node of the pool, i.e. only locally, and
+        return the list of results
+        """
+        return [function(*args)]
+
+    def wait_results(self, progress_callback=None, interval=0.5):
+        """
+        Wait for the results of all workers, calling 'progress_callback'
+        every 'interval' seconds
+        """
+        results = [None] * self.threadcount
+        pending = {self.connections[i]: i for i in range(self.threadcount)}
+        while pending:
+            for connection in wait(list(pending), interval):
+                results[pending.pop(connection)] = connection.recv()
+            if pending and progress_callback:
+                progress_callback()
+        return results
+
+    def fail(self, results):
+        """
+        Report errors of failed benchmark tasks and exit
+        """
+        for task_id, result in enumerate(results):
+            if isinstance(result, BenchmarkError):
+                print("Task #" + str(task_id) + " failed:\n" + result.message, \
+                      file=sys.stderr)
+        print("Benchmark failed - exiting.", file=sys.stderr)
+        sys.exit(1)
+
+    def close(self):
+        """
+        Stop all worker processes
+        """
+        for connection in self.connections:
+            connection.send(None)
+        for worker in self.workers:
+            worker.join()
+
+
+def random_file_sizes(filecount, filesize, deviation):
+    """
+    Draw random sizes of all files written in a benchmark phase
+    """
+    return [get_random_file_size(filesize, deviation) \
+            for i in range(filecount)]
+
+
+class RemotePool(WorkerPool):
+    """
+    Pool of benchmark workers running on remote agents. Each agent runs
+    'threadcount' tasks on its own worker pool, tasks of agent 'i' have ids
+    starting at 'i*threadcount'.
+
+    Phases are started on all agents at the same moment: each agent reports
+    when its tasks wait on the local start barrier and they are released
+    only after all agents are ready. Agents stream their progress counters
+    while the phase is running.
+    """
+
+    def __init__(self, agent_addresses, threadcount, setup, authkey):
+        self.agent_threadcount = threadcount
+        self.nodecount = len(agent_addresses)
+        self.threadcount = threadcount * self.nodecount
+        self.progress_counters = ProgressCounters(self.threadcount)
+        self.connections = [connect_agent(address, authkey) \
+                            for address in agent_addresses]
+        for connection in self.connections:
+            connection.send(setup)
+
+    def receive(self, agent_id):
+        """
+        Receive a message from an agent, exit if it failed or disconnected
+        """
+        try:
+            message = self.connections[agent_id].recv()
+        except EOFError:
+            message = ('error', "Connection closed")
+        if message[0] == 'error':
+            print("Agent #" + str(agent_id) + " failed:\n" + message[1], \
+                  file=sys.stderr)
+            print("Benchmark failed - exiting.", file=sys.stderr)
+            sys.exit(1)
+        return message
+
+    def set_file_sizes(self, file_sizes):
+        """
+        Send the sizes of the test files to all agents, used by all
+        following phases
+        """
+        for connection in self.connections:
+            connection.send(('sizes', list(file_sizes)))
+        for agent_id in range(len(self.connections)):
+            self.receive(agent_id)
+
+    def start(self, benchmark, benchmark_args, filecount, runtime=0.0, \
+              warmup=0.0, active=None):
+        """
+        Send the benchmark phase to all agents, wait until all of them are
+        ready and start the phase on all of them at once. 'active' is the
+        number of workers of each agent which get files.
+        """
+        self.progress_counters.reset()
+        for agent_id, connection in enumerate(self.connections):
+            first_task = agent_id * self.agent_threadcount
+            connection.send(('start', benchmark, benchmark_args[first_task:\
+                                    first_task + self.agent_threadcount], \
+                             filecount, runtime, warmup, active))
+        for agent_id in range(len(self.connections)):
+            self.receive(agent_id)
+        for connection in self.connections:
+            connection.send(('go',))
+
+    def wait_results(self, progress_callback=None, interval=0.5):
+        """
+        Wait for the results of all agents, updating the progress counters
+        of their tasks and calling 'progress_callback' every 'interval'
+        seconds
+        """
+        counters = self.progress_counters
+        results = [None] * len(self.connections)
+        pending = {self.connections[i]: i for i in range(len(self.connections))}
+        next_progress = time.perf_counter() + interval
+        while pending:
+            for connection in wait(list(pending), interval):
+                agent_id = pending[connection]
+                message = self.receive(agent_id)
+                if message[0] == 'progress':
+                    first_task = agent_id * self.agent_threadcount
+                    for i, values in enumerate(zip(*message[1:])):
+                        counters.done_bytes[first_task + i], \
+                            counters.done_ops[first_task + i], \
+                            counters.total_bytes[first_task + i] = values
+                else:
+                    results[agent_id] = message[1]
+                    del pending[connection]
+            if pending and progress_callback \
+                    and time.perf_counter() >= next_progress:
+                progress_callback()
+                next_progress = time.perf_counter() + interval
+        return [result for agent_results in results for result in agent_results]
+
+    def call(self, function, *args):
+        """
+        Call 'function' on all agents and return the list of their results
+        """
+        for connection in self.connections:
+            connection.send(('call', function, args))
+        return [self.receive(agent_id)[1] \
+                for agent_id in range(len(self.connections))]
+
+    def close(self):
+        """
+        Stop all agents
+        """
+        for connection in self.connections:
+            connection.send(('close',))
+            connection.close()
+
+
+def set_tcp_nodelay(connection):
+    """
+    Disable Nagle's algorithm on the socket of a connection, so that the
+    small control messages are not delayed
+    """
+    sock = socket.socket(fileno=os.dup(connection.fileno()))
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.close()
+
+
+def parse_address(address_string, default_host):
+    """
+    Parses '[HOST:]PORT' address
+    """
+    host, _, port = address_string.rpartition(':')
+    return (host or default_host, int(port))
+
+
+def connect_agent(address, authkey, timeout=10.0):
+    """
+    Connect to an agent, retrying until it starts listening
+    """
+    deadline = time.time() + timeout
+    while True:
+        try:
+            connection = Client(address, authkey=authkey)
+            set_tcp_nodelay(connection)
+            return connection
+        except ConnectionRefusedError:
+            if time.time() >= deadline:
+                print("Cannot connect to agent %s:%d - exiting." % address, \
+                      file=sys.stderr)
+                sys.exit(1)
+            time.sleep(0.1)
+
+
+def run_agent(address, authkey):
+    """
+    Serve a single coordinator session. The coordinator sends the benchmark
+    configuration, then phases to run on the local worker pool and calls
+    of functions which prepare or clean up the local test data.
+    """
+    global options, directory_layout, mixed_block_sizes, data_pool, \
+           block_verifier, task_rate
+
+    listener = Listener(address, authkey=authkey)
+    print("Agent listening on %s:%d" % listener.address, file=sys.stderr)
+    connection = listener.accept()
+    set_tcp_nodelay(connection)
+    options, directory_layout, mixed_block_sizes, data_pool, \
+                                            block_verifier = connection.recv()
+    task_rate = RawValue('d', 0.0)
+
+    pool = WorkerPool(options.threadcount, options.workertype, \
+                      options.filecount)
+    progress_counters = pool.progress_counters
+
+    def send_progress():
+        connection.send(('progress', list(progress_counters.done_bytes),
+                         list(progress_counters.done_ops),
+                         list(progress_counters.total_bytes)))
+
+    while True:
+        command = connection.recv()
+        if command[0] == 'start':
+            pool.submit(*command[1:])
+            pool.wait_ready()
+            connection.send(('ready',))
+            connection.recv()
+            pool.release()
+            results = pool.wait_results(send_progress)
+            send_progress()
+            connection.send(('results', results))
+        elif command[0] == 'sizes':
+            pool.set_file_sizes(command[1])
+            connection.send(('result', None))
+        elif command[0] == 'call':
+            try:
+                connection.send(('result', command[1](*command[2])))
+            except Exception:
+                connection.send(('error', traceback.format_exc()))
+        else:
+            break
+
+    pool.close()
+    connection.close()
+    listener.close()
+
+
+def create_test_data_dir():
+    """
+    Remove old test data and create the test folder, returns the time
+    """
+    system("rm -rf " + __test_data_dir)
+    starttime = time.time()
+    os.mkdir(__test_data_dir)
+    return time.time() - starttime
+
+
+def remove_test_data_dir():
+    """
+    Remove the test folder emptied by the delete benchmark, files which
+    were not deleted by it (e.g. rest of a larger kept dataset) are removed
+    together with the folder
+    """
+    remove_manifest()
+    try:
+        os.rmdir(__test_data_dir)
+    except OSError:
+        system("rm -rf " + __test_data_dir)
+
+
+def manifest_layout():
+    """
+    Returns the directory layout parameters stored in the dataset manifest
+    """
+    private = options.dirlayout == 'private'
+    return (options.dirdepth, options.dirfanout, int(private), \
+            options.threadcount if private else 0)
+
+
+def write_manifest(file_sizes):
+    """
+    Write the dataset manifest with the sizes and generations of all files,
+    replacing the previous manifest atomically
+    """
+    generations = block_verifier.generations if block_verifier else repeat(0)
+    verify_blocksize = block_verifier.blocksize if block_verifier else 0
+    data = [manifest_header.pack(manifest_magic, manifest_version, \
+                                 len(file_sizes), *manifest_layout(), \
+                                 verify_blocksize)]
+    data.extend(manifest_entry.pack(size, generation) \
+                for size, generation in zip(file_sizes, generations))
+    with open(__manifest_path + ".tmp", 'wb') as manifest:
+        manifest.write(b''.join(data))
+    os.replace(__manifest_path + ".tmp", __manifest_path)
+
+
+def read_manifest():
+    """
+    Load the dataset manifest with a single sequential read. Returns the
+    sizes of files and the block size of their verification headers or None
+    if there is no manifest for the current directory layout. Generations
+    of the files are restored for verification.
+    """
+    try:
+        with open(__manifest_path, 'rb') as manifest:
+            data = manifest.read()
+    except FileNotFoundError:
+        return None
+    if len(data) < manifest_header.size:
+        return None
+    magic, version, filecount, *layout, verify_blocksize = \
+        manifest_header.unpack_from(data)
+    if magic != manifest_magic or version != manifest_version \
+            or tuple(layout) != manifest_layout() \
+            or len(data) < manifest_header.size \
+                           + filecount * manifest_entry.size:
+        return None
+
+    file_sizes = []
+    entries = manifest_entry.iter_unpack(data[manifest_header.size: \
+                    manifest_header.size + filecount * manifest_entry.size])
+    for file_id, (size, generation) in enumerate(entries):
+        file_sizes.append(size)
+        if block_verifier and file_id < block_verifier.filecount:
+            block_verifier.generations[file_id] = generation
+    return file_sizes, verify_blocksize
+
+
+def remove_manifest():
+    try:
+        os.remove(__manifest_path)
+    except FileNotFoundError:
+        pass
+
+
+def existing_file_sizes(filecount, test_data_dir):
+    """
+    Get the sizes of all files read in a benchmark phase
+    """
+    return [os.path.getsize(directory_layout.file_path(test_data_dir, file_id)) \
+            for file_id in range(filecount)]
+
+
+def find_steady_state(samples):
+    """
+    Returns the index of the first sample from which the throughput in
+    'steady_state_window' consecutive sampling windows has the coefficient
+    of variation below 'steady_state_cv', or None if it never settles
+    """
+    rates = [(b1 - b0)/(t1 - t0) \
+             for (t0, b0), (t1, b1) in zip(samples, samples[1:])]
+    for i in range(len(rates) - steady_state_window + 1):
+        window = rates[i:i + steady_state_window]
+        mean = sum(window) / steady_state_window
+        if mean <= 0:
+            continue
+        stddev = math.sqrt(sum((r - mean)**2 for r in window) \
+                           / steady_state_window)
+        if stddev / mean <= steady_state_cv:
+            return i
+    return None
+
+
+def format_throughput_summary(samples, warmup, steady_state):
+    """
+    Formats the throughput measured after the warmup and in the steady state
+    based on the (time, bytes done) samples of a benchmark phase
+    """
+    lines = []
+    measured = [sample for sample in samples if sample[0] >= warmup]
+    if warmup > 0 and len(measured) >= 2:
+        (t0, b0), (t1, b1) = measured[0], measured[-1]
+        lines.append("--- MEASURED THROUGHPUT: " \
+                     + humanize.naturalsize((b1 - b0)/(t1 - t0)) \
+                     + "/s (excluding %gs warmup)" % warmup)
+    if steady_state:
+        start = find_steady_state(measured)
+        if start is None:
+            lines.append("--- STEADY STATE: not reached")
+        else:
+            (t0, b0), (t1, b1) = measured[start], measured[-1]
+            lines.append("--- STEADY STATE THROUGHPUT: " \
+                         + humanize.naturalsize((b1 - b0)/(t1 - t0)) \
+                         + "/s (reached after %.1fs)" % t0)
+    return "\n".join(lines)
+
+
+def run_warm_read_benchmark(pool, benchmark, file_sizes, threadcount, \
+                            blocksize, cold_throughput):
+    """
+    Pre-read the test files into the page cache and run the read benchmark
+    again, reporting its throughput next to the cold cache throughput
+    """
+    print("\n--- PRE-READING TEST FILES INTO PAGE CACHE...\n", file=sys.stderr)
+    run_benchmark(pool, file_linear_read_benchmark, file_sizes, \
+                  threadcount, blocksize)
+
+    print("\n--- RUNNING WARM CACHE BENCHMARK...\n", file=sys.stderr)
+    warm_time, threads_results = \
+        run_benchmark(pool, benchmark, file_sizes, threadcount, blocksize, \
+                      time_bounded=True)
+    warm_bytes = sum(s[0] for s in threads_results)
+
+    print("", file=sys.stderr)
+    print("--- WARM CACHE THROUGHPUT: " \
+          + str(humanize.naturalsize(warm_bytes / warm_time)) + "/s" \
+          + ", COLD CACHE THROUGHPUT: " \
+          + str(humanize.naturalsize(cold_throughput)) + "/s", \
+          file=sys.stderr)
+    print(format_latency_summary(merge_latency_histograms(threads_results)), \
+          file=sys.stderr)
+    print("", file=sys.stderr)
+
+
+def run_rate_sweep(pool, rates, rate_divisor, file_sizes, threadcount, \
+                   blocksize, dropcaches):
+    """
+    Run the random read benchmark at each target rate and report the
+    achieved rate and latency, i.e. the latency-throughput curve
+    """
+    curve = []
+    for rate in rates:
+        print("\n--- INITIALIZING RANDOM READ BENCHMARK AT %.1f ops/s...\n" \
+              % rate, file=sys.stderr)
+        pool.call(set_task_rate, rate / rate_divisor)
+        sweep_time, threads_results = \
+            run_benchmark(pool, file_random_read_benchmark, file_sizes, \
+                          threadcount, blocksize, time_bounded=True)
+        read_latency = merge_latency_histograms(threads_results)['read']
+        sweep_bytes = sum(s[0] for s in threads_results)
+        curve.append("--- RATE %.1f ops/s: achieved %.1f ops/s, %s/s, " \
+                     % (rate, read_latency.total_count() / sweep_time, \
+                        humanize.naturalsize(sweep_bytes / sweep_time)) \
+            + ", ".join("p%g=%.1f" \
+                        % (p, read_latency.value_at_percentile(p)/1e3) \
+                        for p in latency_percentiles) \
+            + ", max=%.1f [us]" % (read_latency.max/1e3))
+
+        if dropcaches:
+            print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
+            evict_caches(pool, len(file_sizes))
+            print(" DONE", file=sys.stderr)
+
+    print("\n--- RANDOM READ LATENCY AGAINST TARGET RATE", file=sys.stderr)
+    print("\n".join(curve), file=sys.stderr)
+    print("", file=sys.stderr)
+
+
+def find_knee(throughputs):
+    """
+    Returns the index of the knee of a throughput scaling curve, i.e. the
+    first point after which the next step gains less than
+    'knee_gain_threshold' of the throughput
+    """
+    for i in range(len(throughputs) - 1):
+        if throughputs[i + 1] < throughputs[i] * (1.0 + knee_gain_threshold):
+            return i
+    return len(throughputs) - 1
+
+
+def format_scaling_matrix(phase, blocksizes, workercounts, cells):
+    """
+    Formats throughput and p99 latency of each block size and worker count
+    of the scaling sweep as a matrix, marking the knee of each row
+    """
+    lines = ["--- SCALING SWEEP " + phase \
+             + " THROUGHPUT [/s], P99 [us] (* KNEE)",
+             "%-12s" % "BLOCK SIZE" \
+             + "".join("%24s" % ("%d WORKERS" % workers) \
+                       for workers in workercounts)]
+    for blocksize in blocksizes:
+        row = [cells[(phase, blocksize, workers)] for workers in workercounts]
+        knee = find_knee([throughput for throughput, latency in row])
+        lines.append("%-12s" % humanize.naturalsize(blocksize) \
+            + "".join("%24s" % ("%s %.1f%s" \
+                                % (humanize.naturalsize(throughput), \
+                                   latency.value_at_percentile(99.0)/1e3, \
+                                   "*" if i == knee else " ")) \
+                      for i, (throughput, latency) in enumerate(row)))
+    return "\n".join(lines)
+
+
+def write_scaling_csv(path, phases, blocksizes, workercounts, cells):
+    """
+    Write all cells of the scaling sweep with the knee of each row to
+    a CSV file
+    """
+    with open(path, 'w') as csv_file:
+        print("STORAGE NAME;PHASE;BLOCK SIZE;WORKERS;THROUGHPUT [B/s];" \
+              + ";".join("P%g [us]" % p for p in latency_percentiles) \
+              + ";MAX [us];KNEE", file=csv_file)
+        for phase in phases:
+            for blocksize in blocksizes:
+                row = [cells[(phase, blocksize, workers)] \
+                       for workers in workercounts]
+                knee = find_knee([throughput for throughput, latency in row])
+                for i, (throughput, latency) in enumerate(row):
+                    print(options.name + ";" + phase + ";" \
+                          + str(blocksize) + ";" \
+                          + str(workercounts[i]) + ";" \
+                          + str(throughput) + ";" \
+                          + ";".join(latency_csv_values(latency)) + ";" \
+                          + str(int(i == knee)), file=csv_file)
+
+
+def mixed_batch_count(file_sizes, blocksize):
+    """
+    Returns the number of operation batches of the mixed benchmark, by
+    default it performs as many operations as there are blocks in all files
+    """
+    mixed_ops = options.mixedops
+    if mixed_ops <= 0:
+        mixed_ops = sum((size + blocksize - 1) // blocksize \
+                        for size in file_sizes)
+    return (mixed_ops + mixed_batch_size - 1) // mixed_batch_size
 
 
-def drop_caches():
+def run_harness_calibration(threadcount, file_sizes, blocksize):
     """
-    Drops file cache
+    Run the data benchmarks with the null I/O engine in a separate local
+    worker pool, so that no data is written or read.
+
+    Returns the ceiling of the benchmark harness itself for each phase,
+    as block operations and bytes per second.
     """
+    engine, profile = options.engine, options.profile
+    options.engine, options.profile = 'null', None
+    pool = WorkerPool(threadcount, options.workertype, len(file_sizes))
+    pool.set_file_sizes(file_sizes)
+
+    phases = [("CREATE", file_create_benchmark, None),
+              ("RANDOM WRITE", file_random_write_benchmark, None),
+              ("WRITE", file_write_benchmark, None),
+              ("LINEAR READ", file_linear_read_benchmark, None),
+              ("RANDOM READ", file_random_read_benchmark, None)]
+    if options.mixed:
+        phases.append(("MIXED", file_mixed_benchmark, \
+                       mixed_batch_count(file_sizes, blocksize)))
+
+    ceilings = {}
+    for phase, benchmark, filecount in phases:
+        print("\n--- CALIBRATING " + phase + " BENCHMARK...\n", \
+              file=sys.stderr)
+        calibration_time, threads_results = \
+            run_benchmark(pool, benchmark, file_sizes, threadcount, \
+                          blocksize, filecount=filecount, time_bounded=True)
+        calibration_ops = sum(histogram.total_count() for op, histogram \
+            in merge_latency_histograms(threads_results).items() \
+            if op in ('read', 'write'))
+        ceilings[phase] = \
+            (calibration_ops / calibration_time, \
+             sum(s[0] for s in threads_results) / calibration_time)
+
+    pool.close()
+    options.engine, options.profile = engine, profile
+
+    print("", file=sys.stderr)
+    for phase, benchmark, filecount in phases:
+        print("--- HARNESS CEILING " + phase + ": %.1f ops/s, " \
+              % ceilings[phase][0] \
+              + str(humanize.naturalsize(ceilings[phase][1])) + "/s", \
+              file=sys.stderr)
+    print("", file=sys.stderr)
+    return ceilings
 
-    cmd = ""
-    if sys.platform == "linux" or sys.platform == "linux2":
-        cmd = "sudo sh -c 'sync ; echo 3 > /proc/sys/vm/drop_caches'"
-    elif sys.platform == "darwin":
-        cmd = "sudo sh -c 'sync; purge'"
-    else:
-        print ( sys.platform, " platform is not supported - exiting." )
-        sys.exit(1)
 
-    system(cmd)
+def format_harness_load(ceiling, ops_rate):
+    """
+    Formats the rate of block operations of a phase relative to the
+    ceiling of the benchmark harness
+    """
+    return "--- HARNESS CEILING: %.1f ops/s, %.1f%% USED" \
+           % (ceiling[0], 100.0 * ops_rate / ceiling[0] if ceiling[0] else 0.0)
 
 
-def format_progress_message(name, progress, total, suffix, width=40, \
-                            numtype='numeric'):
+def run_scaling_sweep(pool, blocksizes, workercounts, file_sizes, \
+                      dropcaches, rewrite=False):
     """
-    Formats the progress
+    Run the read benchmarks, and optionally the random write benchmark, on
+    the existing dataset for each combination of block size and number of
+    workers, and report the throughput and latency of each of them with
+    the knee point where the scaling flattens
     """
-    if numtype == 'normal':
-        p = int((progress*width)/total)
-        percentage = int((progress*100)/total)
-        return name + (" [%-40s] %d%%" % ('='*p, percentage)) + " " \
-            + progress  + "/"\
-            + total  \
-            + " | " \
-            + suffix + "        "
-    elif numtype == 'filesize':
-        p = int((progress*width)/total)
-        percentage = int((progress*100)/total)
-        return name + (" [%-40s] %d%%" % ('='*p, percentage)) + ", " \
-            + humanize.naturalsize(progress)  + " of "\
-            + humanize.naturalsize(total)  \
-            + " | " \
-            + suffix + "        "
+    phases = [("LINEAR READ", file_linear_read_benchmark, 'read'),
+              ("RANDOM READ", file_random_read_benchmark, 'read')]
+    if rewrite:
+        phases.append(("RANDOM WRITE", file_random_write_benchmark, 'write'))
+
+    cells = {}
+    for blocksize in blocksizes:
+        for workers in workercounts:
+            for phase, benchmark, operation in phases:
+                print("\n--- INITIALIZING " + phase + " BENCHMARK WITH " \
+                      + humanize.naturalsize(blocksize) \
+                      + " BLOCKS AND " + str(workers * pool.nodecount) \
+                      + " WORKERS...\n", file=sys.stderr)
+                sweep_time, threads_results = \
+                    run_benchmark(pool, benchmark, file_sizes, \
+                                  pool.threadcount, blocksize, \
+                                  time_bounded=True, active=workers)
+                sweep_bytes = sum(s[0] for s in threads_results)
+                cells[(phase, blocksize, workers * pool.nodecount)] = \
+                    (sweep_bytes / sweep_time, \
+                     merge_latency_histograms(threads_results)[operation])
+
+                if dropcaches:
+                    print("\n--- DROPPING FILE CACHE...", end="", \
+                          file=sys.stderr)
+                    evict_caches(pool, len(file_sizes))
+                    print(" DONE", file=sys.stderr)
+
+    workercounts = [workers * pool.nodecount for workers in workercounts]
+    print("", file=sys.stderr)
+    for phase, benchmark, operation in phases:
+        print(format_scaling_matrix(phase, blocksizes, workercounts, cells), \
+              file=sys.stderr)
+        print("", file=sys.stderr)
+
+    if options.sweepcsv:
+        write_scaling_csv(options.sweepcsv, [phase for phase, _, _ in phases], \
+                          blocksizes, workercounts, cells)
 
 
-def run_benchmark(benchmark, \
-                  filecount, threadcount, deviation, blocksize, \
-                  threads_results, threads_progress_messages):
+def run_benchmark(pool, benchmark, file_sizes, threadcount, blocksize, \
+                  filecount=None, numtype='filesize', time_bounded=False, \
+                  active=None):
     """
-    This is a generic function for running naive benchmarks
+    This is a generic function for running naive benchmarks.
+    In multi-node runs the pool runs 'threadcount' tasks on each node.
+    If 'active' is given, only the first 'active' tasks of each node get
+    files.
+
+    All tasks get the same arguments, the files are distributed dynamically
+    through the shared file queue of the worker pool. Tasks read the file
+    sizes from the worker pool, which must be given them beforehand with
+    'set_file_sizes'. Benchmarks of empty files pass 'filecount' instead of
+    the list of file sizes.
+
+    Time-bounded phases loop over the files for the configured runtime,
+    their throughput is sampled with the progress to exclude the warmup
+    and detect the steady state. Tasks measure their bytes, time and
+    resource usage from the end of the warmup, so with a warmup the
+    returned execution time is the longest measured time of the tasks.
     """
 
-    #
-    # Initialize barrier lock to wait until the threads initialize before
-    # starting time measurement
-    #
-    start_barrier = Manager().Barrier(threadcount+1)
+    if filecount is None:
+        filecount = len(file_sizes)
+
+    threadcount = pool.threadcount
+    benchmark_args = [(blocksize, __test_data_dir)] * threadcount
 
     #
-    # Prepapre a list of arguments for each benchmark task
+    # Start the benchmark on the worker pool and wait for all benchmark
+    # tasks to initialize
     #
-    benchmark_args = []
-    for tidx in range(threadcount):
+    runtime, warmup = 0.0, 0.0
+    if time_bounded:
+        runtime, warmup = options.runtime, options.warmup
 
-        r = None
-        if(filecount == threadcount):
-            r = [tidx]
-        else:
-            low_range = int(tidx*(filecount/threadcount))
-            high_range = int((tidx+1)*(filecount/threadcount))
-            r = list(range(low_range, high_range))
+    pool.start(benchmark, benchmark_args, filecount, runtime, warmup, active)
 
-        benchmark_args.append(\
-            (tidx, r, filesize, deviation, blocksize, __test_data_dir, \
-               threads_results, threads_progress_messages, start_barrier))
-        threads_results[tidx] = 0
-        threads_progress_messages[tidx] = "Starting task "+str(tidx)
+    start_time = time.perf_counter()
+    samples = [(0.0, 0)]
 
     #
-    # Create the process pool and run the benchmark
+    # Wait for the tasks to complete and print the progress every
+    # 0.5 second
     #
-    progress_bars = []
-    for i in range(threadcount):
-        child = Process(target=benchmark, \
-                        args=benchmark_args[i])
-        child.start()
-        threads.append(child)
+    def print_progress():
+        elapsed_time = time.perf_counter() - start_time
+        samples.append((elapsed_time, sum(pool.progress_counters.done_bytes)))
+        for message in pool.progress_counters.format_messages(\
+                            [elapsed_time]*threadcount,
+                            numtype):
+            print(message, file=sys.stderr)
+        for i in range(threadcount):
+            sys.stderr.write("\x1b[A")
 
-    #
-    # Wait for all benchmark tasks to initialize
-    #
-    start_barrier.wait()
+    threads_results = pool.wait_results(print_progress)
+
+    real_execution_time = time.perf_counter() - start_time
+
+    if any(isinstance(result, BenchmarkError) for result in threads_results):
+        pool.fail(threads_results)
 
-    start_time = time.time()
     #
-    # Wait for the threads to complete and the progress every 
-    # 0.5 second
+    # Print final progress based on the execution time of each task
     #
-    time.sleep(0.5)
-    while any(thread.is_alive() for thread in threads):
-        time.sleep(0.5)
-        for i in range(threadcount):
-            print(threads_progress_messages[i], file=sys.stderr)
-        for i in range(threadcount):
-            sys.stderr.write("\x1b[A")
+    for message in pool.progress_counters.format_messages(\
+                [result[1] for result in threads_results], numtype):
+        print(message, file=sys.stderr)
 
-    for i in range(threadcount):
-        print(threads_progress_messages[i], file=sys.stderr)
+    if time_bounded and (warmup > 0 or options.steadystate):
+        samples.append((real_execution_time, \
+                        sum(pool.progress_counters.done_bytes)))
+        print(format_throughput_summary(samples, warmup, \
+                                        options.steadystate), file=sys.stderr)
 
-    real_execution_time = time.time() - start_time
+    if time_bounded and warmup > 0:
+        real_execution_time = max(result[1] for result in threads_results)
 
-    return real_execution_time
+    return real_execution_time, threads_results
 
 
-def file_create_benchmark(task_id, file_ids, filesize, deviation, \
-                          blocksize, test_data_dir, \
-                          thread_results, thread_progress_messages, \
-                          start_barrier):
+def file_create_benchmark(task_id, file_sizes, blocksize, \
+                          test_data_dir, progress_counters, \
+                          start_barrier, file_queue, file_ids=None):
     """
-    Task which creates a set of test files and measures total time
+    Task which creates a set of test files and measures total time. If
+    'file_ids' is given, only these files are created.
     """
 
     total_written_bytes = 0
 
     #
-    # Generate random file sizes and calculate total size for this task
+    # Files are pulled from the shared queue, so the total size of this task
+    # grows as the files are taken
     #
-    random_file_sizes = \
-                  [get_random_file_size(filesize, deviation) for i in file_ids]
-    total_size_to_write = sum(random_file_sizes)
+    task_file_ids = []
+
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_written_bytes,
-                                total_size_to_write,
-                                "???",
-                                width=40, numtype='filesize')
+    next_block = data_pool.block_source()
 
-    randdata = get_random_data(blocksize)
+    histograms = new_latency_histograms(('open', 'write', 'sync', 'close'))
+    record_open = histograms['open'].record
+    record_write = histograms['write'].record
+    record_sync = histograms['sync'].record
+    record_close = histograms['close'].record
+
+    sync_mode = options.syncmode
+    pace = new_pacer()
+    io_queue = new_io_queue(record_write, blocksize, pace)
 
     start_barrier.wait()
-    start_time = time.time()
-    for i in range(len(file_ids)):
+    task_files = file_queue.files(task_id, histograms, done_bytes)
+    for file_index in task_files:
+        file_id = file_ids[file_index] if file_ids is not None else file_index
         #
         # Create random size file
         #
-        rand_size = random_file_sizes[i]
-        outfile = open(test_data_dir + "/" + str(file_ids[i]), "wb")
+        task_file_ids.append(file_id)
+        rand_size = file_sizes[file_id]
+        total_bytes[task_id] += rand_size
+        op_start = monotonic_ns()
+        outfile = open_benchmark_file(\
+                        directory_layout.file_path(test_data_dir, file_id), \
+                        os.O_WRONLY | os.O_CREAT | os.O_TRUNC, rand_size)
+        record_open(monotonic_ns() - op_start)
+        write_block = outfile.write_block
+        generation = block_verifier.start_write(file_id) \
+                     if block_verifier else 0
         #
         # Rewrite random device to the output file in 'blocksize' blocks
         #
-        file_written_bytes = 0
-        while(file_written_bytes + blocksize < rand_size):
-            block_written_bytes = outfile.write(randdata)
-            file_written_bytes += block_written_bytes
+        tail_offset = full_blocks_size(rand_size, blocksize)
+        complete = True
+        for offset in range(0, tail_offset, blocksize):
+            if task_files.expired():
+                complete = False
+                break
+            block = next_block(blocksize, file_id, offset, generation)
+            if io_queue:
+                block_written_bytes = io_queue.submit(write_block, block, offset)
+            else:
+                op_start = pace()
+                block_written_bytes = write_block(block, offset)
+                record_write(monotonic_ns() - op_start)
+                if sync_mode == 'block':
+                    timed_sync(outfile, record_sync)
             total_written_bytes += block_written_bytes
             #
-            # Format progress message
+            # Update progress counters
             #
-            create_current_throughput = \
-                humanize.naturalsize(total_written_bytes/(time.time()-start_time)) \
-                + "/s"
-
-            thread_progress_messages[task_id] = \
-                format_progress_message("Task #" + str(task_id),
-                                        total_written_bytes,
-                                        total_size_to_write,
-                                        create_current_throughput,
-                                        width=40, numtype='filesize')
+            done_bytes[task_id] = total_written_bytes
+            done_ops[task_id] += 1
 
         #
-        # Write remainder of the file
+        # Wait for outstanding requests and write remainder of the file
         #
-        block_written_bytes = \
-                    outfile.write(randdata[0:rand_size - file_written_bytes])
+        if io_queue:
+            total_written_bytes += io_queue.drain()
+        block = next_block(rand_size - tail_offset, file_id, tail_offset, \
+                           generation)
+        op_start = pace()
+        block_written_bytes = outfile.write_tail(block, tail_offset)
+        record_write(monotonic_ns() - op_start)
         total_written_bytes += block_written_bytes
+        done_ops[task_id] += 1
+
+        #
+        # Flush the file to stable storage if requested
+        #
+        if sync_mode == 'block' or sync_mode == 'file':
+            timed_sync(outfile, record_sync)
 
         #
         # Truncate if configured for consecutive write benchmarks
         #
         if options.truncate:
-            outfile.truncate(0)
+            outfile.truncate()
 
-    end_time = time.time() - start_time
+        op_start = monotonic_ns()
+        outfile.close()
+        record_close(monotonic_ns() - op_start)
+        #
+        # Blocks of a file left in the middle at the end of the runtime
+        # cannot be verified
+        #
+        if block_verifier:
+            if complete:
+                block_verifier.end_write(file_id, generation)
+            else:
+                block_verifier.invalidate(file_id)
 
-    current_throughput = \
-        humanize.naturalsize(total_written_bytes/(time.time()-start_time)) \
-        + "/s"
+    #
+    # Flush all written files at the end of the phase if requested
+    #
+    if sync_mode == 'phase':
+        sync_files(test_data_dir, task_file_ids, record_sync)
+
+    measured_bytes, end_time, usage = task_files.measured(total_written_bytes)
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_written_bytes,
-                                total_size_to_write,
-                                current_throughput,
-                                width=40, numtype='filesize')
+    if io_queue:
+        io_queue.close()
 
-    thread_results[task_id] = (total_written_bytes, end_time)
+    done_bytes[task_id] = total_written_bytes
 
+    return (measured_bytes, end_time, histograms, usage, \
+            len(task_file_ids))
 
 
-def file_write_benchmark(task_id, file_ids, filesize, deviation, \
-                          blocksize, test_data_dir, \
-                          thread_results, thread_progress_messages, \
-                          start_barrier):
+
+def file_write_benchmark(task_id, file_sizes, blocksize, \
+                         test_data_dir, progress_counters, \
+                         start_barrier, file_queue):
     """
     Benchmark testing writing to existing files
     """
@@ -326,79 +2551,121 @@ def file_write_benchmark(task_id, file_ids, filesize, deviation, \
     total_written_bytes = 0
 
     #
-    # Generate random file sizes and calculate total size for this task
-    # \todo fix when files have random sizes
-    random_file_sizes = \
-                  [get_random_file_size(filesize, deviation) for i in file_ids]
-    total_size_to_write = sum(random_file_sizes)
+    # Files are pulled from the shared queue, so the total size of this task
+    # grows as the files are taken
+    #
+    task_file_ids = []
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_written_bytes,
-                                total_size_to_write,
-                                "???",
-                                width=40, numtype='filesize')
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
 
+    next_block = data_pool.block_source()
 
-    randdata = get_random_data(blocksize)
+    histograms = new_latency_histograms(('open', 'write', 'sync', 'close'))
+    record_open = histograms['open'].record
+    record_write = histograms['write'].record
+    record_sync = histograms['sync'].record
+    record_close = histograms['close'].record
+
+    sync_mode = options.syncmode
+    pace = new_pacer()
+    io_queue = new_io_queue(record_write, blocksize, pace)
 
     start_barrier.wait()
-    start_time = time.time()
-    for i in range(len(file_ids)):
+    task_files = file_queue.files(task_id, histograms, done_bytes)
+    for file_id in task_files:
         #
         # Create random size file
         #
-        rand_size = random_file_sizes[i]
-        outfile = open(test_data_dir + "/" + str(file_ids[i]), "wb")
+        task_file_ids.append(file_id)
+        rand_size = file_sizes[file_id]
+        total_bytes[task_id] += rand_size
+        op_start = monotonic_ns()
+        outfile = open_benchmark_file(\
+                        directory_layout.file_path(test_data_dir, file_id), \
+                        os.O_WRONLY | os.O_CREAT | os.O_TRUNC, rand_size)
+        record_open(monotonic_ns() - op_start)
+        write_block = outfile.write_block
+        generation = block_verifier.start_write(file_id) \
+                     if block_verifier else 0
         #
         # Rewrite random device to the output file in 'blocksize' blocks
         #
-        file_written_bytes = 0
-        while(file_written_bytes + blocksize < rand_size):
-            block_written_bytes = outfile.write(randdata)
-            file_written_bytes += block_written_bytes
+        tail_offset = full_blocks_size(rand_size, blocksize)
+        complete = True
+        for offset in range(0, tail_offset, blocksize):
+            if task_files.expired():
+                complete = False
+                break
+            block = next_block(blocksize, file_id, offset, generation)
+            if io_queue:
+                block_written_bytes = io_queue.submit(write_block, block, offset)
+            else:
+                op_start = pace()
+                block_written_bytes = write_block(block, offset)
+                record_write(monotonic_ns() - op_start)
+                if sync_mode == 'block':
+                    timed_sync(outfile, record_sync)
             total_written_bytes += block_written_bytes
             #
-            # Format progress message
+            # Update progress counters
             #
-            create_current_throughput = \
-                humanize.naturalsize(total_written_bytes/(time.time()-start_time)) \
-                + "/s"
-
-            thread_progress_messages[task_id] = \
-                format_progress_message("Task #" + str(task_id),
-                                        total_written_bytes,
-                                        total_size_to_write,
-                                        create_current_throughput,
-                                        width=40, numtype='filesize')
+            done_bytes[task_id] = total_written_bytes
+            done_ops[task_id] += 1
 
         #
-        # Write remainder of the file
+        # Wait for outstanding requests and write remainder of the file
         #
-        block_written_bytes = \
-                    outfile.write(randdata[0:rand_size - file_written_bytes])
+        if io_queue:
+            total_written_bytes += io_queue.drain()
+        block = next_block(rand_size - tail_offset, file_id, tail_offset, \
+                           generation)
+        op_start = pace()
+        block_written_bytes = outfile.write_tail(block, tail_offset)
+        record_write(monotonic_ns() - op_start)
         total_written_bytes += block_written_bytes
+        done_ops[task_id] += 1
 
-    end_time = time.time() - start_time
+        #
+        # Flush the file to stable storage if requested
+        #
+        if sync_mode == 'block' or sync_mode == 'file':
+            timed_sync(outfile, record_sync)
 
-    current_throughput = \
-        humanize.naturalsize(total_written_bytes/(time.time()-start_time)) \
-        + "/s"
+        op_start = monotonic_ns()
+        outfile.close()
+        record_close(monotonic_ns() - op_start)
+        #
+        # Blocks of a file left in the middle at the end of the runtime
+        # cannot be verified
+        #
+        if block_verifier:
+            if complete:
+                block_verifier.end_write(file_id, generation)
+            else:
+                block_verifier.invalidate(file_id)
+
+    #
+    # Flush all written files at the end of the phase if requested
+    #
+    if sync_mode == 'phase':
+        sync_files(test_data_dir, task_file_ids, record_sync)
+
+    measured_bytes, end_time, usage = task_files.measured(total_written_bytes)
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_written_bytes,
-                                total_size_to_write,
-                                current_throughput,
-                                width=40, numtype='filesize')
+    if io_queue:
+        io_queue.close()
 
-    thread_results[task_id] = (total_written_bytes, end_time)
+    done_bytes[task_id] = total_written_bytes
 
+    return (measured_bytes, end_time, histograms, usage, \
+            len(task_file_ids))
 
-def file_random_write_benchmark(task_id, file_ids, filesize, deviation, \
-                          blocksize, test_data_dir, \
-                          thread_results, thread_progress_messages, \
-                          start_barrier):
+
+def file_random_write_benchmark(task_id, file_sizes, blocksize, \
+                                test_data_dir, progress_counters, \
+                                start_barrier, file_queue):
     """
     Benchmark testing writing to existing files
     """
@@ -406,249 +2673,825 @@ def file_random_write_benchmark(task_id, file_ids, filesize, deviation, \
     total_written_bytes = 0
 
     #
-    # Generate random file sizes and calculate total size for this task
-    # \todo fix when files have random sizes
-    random_file_sizes = \
-                  [get_random_file_size(filesize, deviation) for i in file_ids]
-    total_size_to_write = sum(random_file_sizes)
+    # Files are pulled from the shared queue, so the total size of this task
+    # grows as the files are taken
+    #
+    task_file_ids = []
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_written_bytes,
-                                total_size_to_write,
-                                "???",
-                                width=40, numtype='filesize')
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
 
+    next_block = data_pool.block_source()
 
-    randdata = get_random_data(blocksize)
+    histograms = new_latency_histograms(('open', 'write', 'sync', 'close'))
+    record_open = histograms['open'].record
+    record_write = histograms['write'].record
+    record_sync = histograms['sync'].record
+    record_close = histograms['close'].record
+
+    sync_mode = options.syncmode
+    pace = new_pacer()
+    io_queue = new_io_queue(record_write, blocksize, pace)
 
     start_barrier.wait()
-    start_time = time.time()
-    for i in range(len(file_ids)):
+    task_files = file_queue.files(task_id, histograms, done_bytes)
+    for file_id in task_files:
         #
         # Create random size file
         #
-        rand_size = random_file_sizes[i]
-        outfile = open(test_data_dir + "/" + str(file_ids[i]), "wb")
+        task_file_ids.append(file_id)
+        rand_size = file_sizes[file_id]
+        total_bytes[task_id] += rand_size
+        op_start = monotonic_ns()
+        outfile = open_benchmark_file(\
+                        directory_layout.file_path(test_data_dir, file_id), \
+                        os.O_WRONLY | os.O_CREAT | os.O_TRUNC, rand_size)
+        record_open(monotonic_ns() - op_start)
+        write_block = outfile.write_block
+        generation = block_verifier.start_write(file_id) \
+                     if block_verifier else 0
         #
-        # Prepare a shuffled list of block indexes to write in random order
+        # Write full blocks in pseudo-random order, the permutation of
+        # block indexes is generated lazily using constant memory
         #
-        random_block_indexes = [i for i in range(0,int(rand_size/blocksize))]
-        random.shuffle(random_block_indexes)
-        
-        file_written_bytes = 0
-        for block_index in random_block_indexes:
-            outfile.seek(block_index*blocksize, 0)
-            block_written_bytes = outfile.write(randdata)
-            file_written_bytes += block_written_bytes
+        block_count = rand_size // blocksize
+        complete = True
+        for block_index in random_permutation(block_count):
+            if task_files.expired():
+                complete = False
+                break
+            offset = block_index*blocksize
+            block = next_block(blocksize, file_id, offset, generation)
+            if io_queue:
+                block_written_bytes = io_queue.submit(write_block, block, offset)
+            else:
+                op_start = pace()
+                block_written_bytes = write_block(block, offset)
+                record_write(monotonic_ns() - op_start)
+                if sync_mode == 'block':
+                    timed_sync(outfile, record_sync)
             total_written_bytes += block_written_bytes
 
             #
-            # Format progress message
+            # Update progress counters
             #
-            create_current_throughput = \
-                humanize.naturalsize(total_written_bytes/(time.time()-start_time)) \
-                + "/s"
+            done_bytes[task_id] = total_written_bytes
+            done_ops[task_id] += 1
 
-            thread_progress_messages[task_id] = \
-                format_progress_message("Task #" + str(task_id),
-                                        total_written_bytes,
-                                        total_size_to_write,
-                                        create_current_throughput,
-                                        width=40, numtype='filesize')
+        #
+        # Wait for outstanding requests and write remainder of the file
+        # after the last full block. A file left in the middle at the end of
+        # the runtime keeps its size by writing its last block again.
+        #
+        if io_queue:
+            total_written_bytes += io_queue.drain()
+        tail_offset = block_count*blocksize
+        if not complete and tail_offset == rand_size:
+            tail_offset = max(rand_size - blocksize, 0)
+        if tail_offset < rand_size:
+            block = next_block(rand_size - tail_offset, file_id, \
+                               tail_offset, generation)
+            op_start = pace()
+            block_written_bytes = outfile.write_tail(block, tail_offset)
+            record_write(monotonic_ns() - op_start)
+            total_written_bytes += block_written_bytes
+            done_ops[task_id] += 1
 
         #
-        # Write remainder of the file
+        # Flush the file to stable storage if requested
         #
-        block_written_bytes = \
-                    outfile.write(randdata[0:rand_size - file_written_bytes])
-        total_written_bytes += block_written_bytes
+        if sync_mode == 'block' or sync_mode == 'file':
+            timed_sync(outfile, record_sync)
 
-    end_time = time.time() - start_time
+        op_start = monotonic_ns()
+        outfile.close()
+        record_close(monotonic_ns() - op_start)
+        #
+        # Blocks of a file left in the middle at the end of the runtime
+        # cannot be verified
+        #
+        if block_verifier:
+            if complete:
+                block_verifier.end_write(file_id, generation)
+            else:
+                block_verifier.invalidate(file_id)
 
-    current_throughput = \
-        humanize.naturalsize(total_written_bytes/(time.time()-start_time)) \
-        + "/s"
+    #
+    # Flush all written files at the end of the phase if requested
+    #
+    if sync_mode == 'phase':
+        sync_files(test_data_dir, task_file_ids, record_sync)
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_written_bytes,
-                                total_size_to_write,
-                                current_throughput,
-                                width=40, numtype='filesize')
+    measured_bytes, end_time, usage = task_files.measured(total_written_bytes)
 
-    thread_results[task_id] = (total_written_bytes, end_time)
+    if io_queue:
+        io_queue.close()
 
+    done_bytes[task_id] = total_written_bytes
 
-def file_linear_read_benchmark(task_id, file_ids, filesize, deviation, \
-                               blocksize, test_data_dir, \
-                               thread_results, thread_progress_messages, \
-                               start_barrier):
+    return (measured_bytes, end_time, histograms, usage, \
+            len(task_file_ids))
+
+
+def file_linear_read_benchmark(task_id, file_sizes, blocksize, \
+                               test_data_dir, progress_counters, \
+                               start_barrier, file_queue):
     """
     Benchmark testing the time of linear reading from files 
     """
 
     total_read_bytes = 0
 
-    #
-    # Calculate the size of files to read
-    #
-    file_sizes = {}
-    for f in file_ids:
-        file_sizes[f] = os.path.getsize(test_data_dir+"/"+str(f))
+    task_file_ids = []
 
-    total_size_to_read = sum(file_sizes.values())
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_read_bytes,
-                                total_size_to_read,
-                                "???",
-                                width=40, numtype='filesize')
+    histograms = new_latency_histograms(('open', 'read', 'verify', 'close'))
+    record_open = histograms['open'].record
+    record_read = histograms['read'].record
+    record_verify = histograms['verify'].record
+    record_close = histograms['close'].record
 
+    #
+    # All blocks are read into a single preallocated buffer, the data
+    # is not copied anywhere else
+    #
+    read_buffer = allocate_buffer(blocksize)
+    read_buffers = [read_buffer]
+    pace = new_pacer()
+    io_queue = new_io_queue(record_read, blocksize, pace)
 
-    outfile = open("/dev/null", "wb")
     start_barrier.wait()
-    start_time = time.time()
-
-    for i in range(len(file_ids)):
+    task_files = file_queue.files(task_id, histograms, done_bytes)
+    for file_id in task_files:
         #
         # Open file
         #
-        infile = open(test_data_dir + "/" + str(file_ids[i]), "rb")
+        task_file_ids.append(file_id)
+        total_bytes[task_id] += file_sizes[file_id]
+        op_start = monotonic_ns()
+        infile = open_benchmark_file(\
+                        directory_layout.file_path(test_data_dir, file_id), \
+                                     os.O_RDONLY, file_sizes[file_id])
+        record_open(monotonic_ns() - op_start)
+        read_block = infile.read_block
+        verify_block = None
+        if block_verifier:
+            verify_block = partial(block_verifier.check, record_verify, file_id)
 
         #
         # Read the file in blocks
         #
-        file_read_bytes = 0
-        
-        while(file_read_bytes + blocksize < file_sizes[file_ids[i]]):
-            block_read_bytes = outfile.write(infile.read(blocksize))
-            file_read_bytes += block_read_bytes
+        tail_offset = full_blocks_size(file_sizes[file_id], blocksize)
+        for offset in range(0, tail_offset, blocksize):
+            if task_files.expired():
+                break
+            if io_queue:
+                block_read_bytes = \
+                    io_queue.submit_read(read_block, offset, verify_block)
+            else:
+                op_start = pace()
+                block_read_bytes = read_block(read_buffers, offset)
+                record_read(monotonic_ns() - op_start)
+                if verify_block:
+                    verify_block(read_buffer, offset, block_read_bytes)
             total_read_bytes += block_read_bytes
             #
-            # Format progress message
+            # Update progress counters
             #
-            current_throughput = \
-                humanize.naturalsize(total_read_bytes/(time.time()-start_time)) \
-                + "/s"
-
-            thread_progress_messages[task_id] = \
-                format_progress_message("Task #" + str(task_id),
-                                        total_read_bytes,
-                                        total_size_to_read,
-                                        current_throughput,
-                                        width=40, numtype='filesize')
+            done_bytes[task_id] = total_read_bytes
+            done_ops[task_id] += 1
 
         #
-        # Write remainder of the file
+        # Wait for outstanding requests and read remainder of the file
         #
+        if io_queue:
+            total_read_bytes += io_queue.drain()
+        op_start = pace()
         block_read_bytes = \
-            outfile.write(infile.read(file_sizes[file_ids[i]]-file_read_bytes))
+            infile.read_tail(read_buffer,
+                             file_sizes[file_id] - tail_offset,
+                             tail_offset)
+        record_read(monotonic_ns() - op_start)
+        if verify_block:
+            verify_block(read_buffer, tail_offset, block_read_bytes)
         total_read_bytes += block_read_bytes
+        done_ops[task_id] += 1
 
-    outfile.close()
-    end_time = time.time() - start_time
-    current_throughput = \
-        humanize.naturalsize(total_read_bytes/(time.time()-start_time)) \
-        + "/s"
+        op_start = monotonic_ns()
+        infile.close()
+        record_close(monotonic_ns() - op_start)
+
+    measured_bytes, end_time, usage = task_files.measured(total_read_bytes)
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_read_bytes,
-                                total_size_to_read,
-                                current_throughput,
-                                width=40, numtype='filesize')
-    thread_results[task_id] = (total_read_bytes, end_time)
+    if io_queue:
+        io_queue.close()
+    done_bytes[task_id] = total_read_bytes
+    return (measured_bytes, end_time, histograms, usage, \
+            len(task_file_ids))
 
 
-def file_random_read_benchmark(task_id, file_ids, filesize, deviation, \
-                               blocksize, test_data_dir, \
-                               thread_results, thread_progress_messages, \
-                               start_barrier):
+def file_random_read_benchmark(task_id, file_sizes, blocksize, \
+                               test_data_dir, progress_counters, \
+                               start_barrier, file_queue):
     """
     Benchmark measures the time of random read from files using seek
     """
 
     total_read_bytes = 0
 
+    task_file_ids = []
+
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
+
+    histograms = new_latency_histograms(('open', 'read', 'verify', 'close'))
+    record_open = histograms['open'].record
+    record_read = histograms['read'].record
+    record_verify = histograms['verify'].record
+    record_close = histograms['close'].record
+
+    #
+    # All blocks are read into a single preallocated buffer, the data
+    # is not copied anywhere else
+    #
+    read_buffer = allocate_buffer(blocksize)
+    read_buffers = [read_buffer]
+    pace = new_pacer()
+    io_queue = new_io_queue(record_read, blocksize, pace)
+
+    start_barrier.wait()
+    task_files = file_queue.files(task_id, histograms, done_bytes)
+    for file_id in task_files:
+        #
+        # Open file
+        #
+        task_file_ids.append(file_id)
+        total_bytes[task_id] += file_sizes[file_id]
+        op_start = monotonic_ns()
+        infile = open_benchmark_file(\
+                        directory_layout.file_path(test_data_dir, file_id), \
+                                     os.O_RDONLY, file_sizes[file_id])
+        record_open(monotonic_ns() - op_start)
+        read_block = infile.read_block
+        verify_block = None
+        if block_verifier:
+            verify_block = partial(block_verifier.check, record_verify, file_id)
+        infile_size = file_sizes[file_id]
+
+        #
+        # Read full blocks in pseudo-random order, the permutation of
+        # block indexes is generated lazily using constant memory
+        #
+        block_count = infile_size // blocksize
+        for block_index in random_permutation(block_count):
+            if task_files.expired():
+                break
+            offset = block_index*blocksize
+            if io_queue:
+                block_read_bytes = \
+                    io_queue.submit_read(read_block, offset, verify_block)
+            else:
+                op_start = pace()
+                block_read_bytes = read_block(read_buffers, offset)
+                record_read(monotonic_ns() - op_start)
+                if verify_block:
+                    verify_block(read_buffer, offset, block_read_bytes)
+            total_read_bytes += block_read_bytes
+            #
+            # Update progress counters
+            #
+            done_bytes[task_id] = total_read_bytes
+            done_ops[task_id] += 1
+
+        #
+        # Wait for outstanding requests and read remainder of the file
+        # after the last full block
+        #
+        if io_queue:
+            total_read_bytes += io_queue.drain()
+        tail_offset = block_count*blocksize
+        if tail_offset < infile_size:
+            op_start = pace()
+            block_read_bytes = \
+                infile.read_tail(read_buffer, infile_size - tail_offset,
+                                 tail_offset)
+            record_read(monotonic_ns() - op_start)
+            if verify_block:
+                verify_block(read_buffer, tail_offset, block_read_bytes)
+            total_read_bytes += block_read_bytes
+            done_ops[task_id] += 1
+
+        op_start = monotonic_ns()
+        infile.close()
+        record_close(monotonic_ns() - op_start)
+
+    measured_bytes, end_time, usage = task_files.measured(total_read_bytes)
+
+    if io_queue:
+        io_queue.close()
+    done_bytes[task_id] = total_read_bytes
+    return (measured_bytes, end_time, histograms, usage, \
+            len(task_file_ids))
+
+
+def file_mixed_benchmark(task_id, file_sizes, blocksize, test_data_dir, \
+                         progress_counters, start_barrier, file_queue):
+    """
+    Benchmark of a mixed read/write workload on existing files. Each item
+    of the file queue is a batch of 'mixed_batch_size' operations, whose
+    type, block size and location in the dataset are sampled at once.
+    With 'file' sync mode written files are flushed when they are closed.
+    """
+
+    total_bytes_done = 0
+    task_batch_count = 0
+
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
+
+    histograms = new_latency_histograms(('open', 'read', 'write', 'sync', \
+                                         'verify', 'close'))
+    record_open = histograms['open'].record
+    record_read = histograms['read'].record
+    record_write = histograms['write'].record
+    record_sync = histograms['sync'].record
+    record_verify = histograms['verify'].record
+    record_close = histograms['close'].record
+
+    #
+    # The dataset is addressed in units of 'blocksize', the global block
+    # index is mapped to a file and offset through the prefix sums of the
+    # numbers of blocks in files
+    #
+    block_offsets = [0]
+    for size in file_sizes:
+        block_offsets.append(block_offsets[-1] + \
+                             (size + blocksize - 1) // blocksize)
+    distribution = AccessDistribution(options.distribution, block_offsets[-1],
+                                      options.zipftheta, options.hotdata,
+                                      options.hotaccess)
+    block_sizes, block_weights = mixed_block_sizes
+    read_probability = options.readratio / 100.0
+    average_size = sum(s*w for s, w in zip(block_sizes, block_weights)) \
+                   / sum(block_weights)
+
+    next_block = data_pool.block_source()
+    read_buffer = allocate_buffer(max(block_sizes))
+    read_buffers = {size: [read_buffer[:size]] for size in block_sizes}
+    pace = new_pacer()
+
+    #
+    # Keep a bounded number of files open, closing the least recently used
+    #
+    open_files = collections.OrderedDict()
+
+    #
+    # Files written since they were last flushed
+    #
+    sync_mode = options.syncmode
+    unsynced_file_ids = set()
+
+    start_barrier.wait()
+    task_files = file_queue.files(task_id, histograms, done_bytes)
+    for batch_id in task_files:
+        total_bytes[task_id] += int(average_size * mixed_batch_size)
+        blocks = distribution.sample(mixed_batch_size)
+        sizes = random.choices(block_sizes, block_weights, k=mixed_batch_size)
+        for block, size in zip(blocks, sizes):
+            if task_files.expired():
+                break
+            file_id = bisect.bisect_right(block_offsets, block) - 1
+            file_size = file_sizes[file_id]
+            offset = (block - block_offsets[file_id]) * blocksize
+
+            benchmark_file = open_files.get(file_id)
+            if benchmark_file is None:
+                if len(open_files) >= mixed_open_files:
+                    closed_id, closed_file = open_files.popitem(last=False)
+                    if sync_mode == 'file' \
+                            and closed_id in unsynced_file_ids:
+                        timed_sync(closed_file, record_sync)
+                        unsynced_file_ids.discard(closed_id)
+                    op_start = monotonic_ns()
+                    closed_file.close()
+                    record_close(monotonic_ns() - op_start)
+                op_start = monotonic_ns()
+                benchmark_file = open_benchmark_file(\
+                        directory_layout.file_path(test_data_dir, file_id), \
+                        os.O_RDWR, file_size)
+                record_open(monotonic_ns() - op_start)
+                open_files[file_id] = benchmark_file
+            else:
+                open_files.move_to_end(file_id)
+
+            #
+            # Requests crossing the end of file are clipped to the file size,
+            # only requests of a single whole block, or of the last block
+            # of the file when clipped, can be verified
+            #
+            clipped = offset + size > file_size
+            whole_block = size == blocksize \
+                          or (clipped and file_size - offset <= blocksize)
+            if random.random() < read_probability:
+                op_start = pace()
+                if clipped:
+                    bytes_done = benchmark_file.read_tail(\
+                                read_buffer, file_size - offset, offset)
+                else:
+                    bytes_done = benchmark_file.read_block(\
+                                read_buffers[size], offset)
+                record_read(monotonic_ns() - op_start)
+                if block_verifier and whole_block:
+                    block_verifier.check(record_verify, file_id, \
+                                         read_buffer, offset, bytes_done)
+            else:
+                generation = 0
+                if block_verifier:
+                    if not whole_block:
+                        block_verifier.invalidate(file_id)
+                    generation = max(block_verifier.generations[file_id], 0)
+                block = next_block(min(size, file_size - offset), file_id, \
+                                   offset, generation)
+                op_start = pace()
+                if clipped:
+                    bytes_done = benchmark_file.write_tail(block, offset)
+                else:
+                    bytes_done = benchmark_file.write_block(block, offset)
+                record_write(monotonic_ns() - op_start)
+                if sync_mode == 'block':
+                    timed_sync(benchmark_file, record_sync)
+                elif sync_mode != 'none':
+                    unsynced_file_ids.add(file_id)
+            total_bytes_done += bytes_done
+            done_ops[task_id] += 1
+        done_bytes[task_id] = total_bytes_done
+        task_batch_count += 1
+
+    for file_id, benchmark_file in open_files.items():
+        if sync_mode == 'file' and file_id in unsynced_file_ids:
+            timed_sync(benchmark_file, record_sync)
+            unsynced_file_ids.discard(file_id)
+        op_start = monotonic_ns()
+        benchmark_file.close()
+        record_close(monotonic_ns() - op_start)
+
+    #
+    # Flush all written files at the end of the phase if requested
+    #
+    if sync_mode == 'phase':
+        sync_files(test_data_dir, sorted(unsynced_file_ids), record_sync)
+
+    measured_bytes, end_time, usage = task_files.measured(total_bytes_done)
+
+    return (measured_bytes, end_time, histograms, usage, \
+            task_batch_count)
+
+
+def file_delete_benchmark(task_id, file_sizes, blocksize, test_data_dir, \
+                          progress_counters, start_barrier, file_queue):
+    """
+    Benchmark measuring the time of removing test files
+    """
+
+    task_file_count = 0
+
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
+
+    histograms = new_latency_histograms(('unlink',))
+    record_unlink = histograms['unlink'].record
+
+    start_barrier.wait()
+    start_time = time.time()
+    usage_start = get_resource_usage()
+
+    for file_id in file_queue.files(task_id):
+        path = directory_layout.file_path(test_data_dir, file_id)
+        total_bytes[task_id] += 1
+        op_start = monotonic_ns()
+        os.unlink(path)
+        record_unlink(monotonic_ns() - op_start)
+        task_file_count += 1
+        #
+        # Delete progress is counted in operations
+        #
+        done_bytes[task_id] = task_file_count
+        done_ops[task_id] = task_file_count
+
+    end_time = time.time() - start_time
+    usage = tuple(end - start for start, end in \
+                        zip(usage_start, get_resource_usage()))
+
+    return (0, end_time, histograms, usage, task_file_count)
+
+
+def file_evict_benchmark(task_id, file_sizes, blocksize, test_data_dir, \
+                         progress_counters, start_barrier, file_queue):
+    """
+    Task evicting the test files from the page cache, the files are flushed
+    first because dirty pages are not evicted
+    """
+
+    task_file_count = 0
+
+    histograms = new_latency_histograms(('evict',))
+    record_evict = histograms['evict'].record
+
+    start_barrier.wait()
+    start_time = time.time()
+    usage_start = get_resource_usage()
+
+    for file_id in file_queue.files(task_id):
+        op_start = monotonic_ns()
+        try:
+            fd = os.open(directory_layout.file_path(test_data_dir, file_id), \
+                         os.O_RDONLY)
+        except FileNotFoundError:
+            continue
+        try:
+            os.fdatasync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+        record_evict(monotonic_ns() - op_start)
+        task_file_count += 1
+
+    end_time = time.time() - start_time
+    usage = tuple(end - start for start, end in \
+                        zip(usage_start, get_resource_usage()))
+
+    return (0, end_time, histograms, usage, task_file_count)
+
+
+def create_empty_file(path):
+    os.close(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+
+
+def open_close_file(path):
+    os.close(os.open(path, os.O_RDONLY))
+
+
+def rename_file(path):
+    os.rename(path, path + renamed_file_suffix)
+
+
+metadata_functions = {'create': create_empty_file,
+                      'stat': os.stat,
+                      'open': open_close_file,
+                      'rename': rename_file,
+                      'utime': os.utime,
+                      'unlink': os.unlink}
+
+
+def file_metadata_benchmark(operation, task_id, file_sizes, blocksize, \
+                            test_data_dir, progress_counters, \
+                            start_barrier, file_queue):
+    """
+    Benchmark measuring the rate of a single metadata operation on empty
+    files. Like in mdtest, each operation is a separate phase executed on
+    all files before the next operation starts.
+    """
+
+    task_file_count = 0
+
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
+
+    histograms = new_latency_histograms((operation,))
+    record_op = histograms[operation].record
+    metadata_function = metadata_functions[operation]
+
     #
-    # Calculate the size of files to read
+    # Operations following the rename phase access renamed files
     #
-    file_sizes = {}
-    for f in file_ids:
-        file_sizes[f] = os.path.getsize(test_data_dir+"/"+str(f))
+    metadata_dir = test_data_dir + "/" + metadata_dir_name
+    path_suffix = ""
+    if metadata_operations.index(operation) \
+            > metadata_operations.index('rename'):
+        path_suffix = renamed_file_suffix
+
+    start_barrier.wait()
+    start_time = time.time()
+    usage_start = get_resource_usage()
+
+    for file_id in file_queue.files(task_id):
+        path = directory_layout.file_path(metadata_dir, file_id) + path_suffix
+        total_bytes[task_id] += 1
+        op_start = monotonic_ns()
+        metadata_function(path)
+        record_op(monotonic_ns() - op_start)
+        task_file_count += 1
+        #
+        # Metadata progress is counted in operations
+        #
+        done_bytes[task_id] = task_file_count
+        done_ops[task_id] = task_file_count
+
+    end_time = time.time() - start_time
+    usage = tuple(end - start for start, end in \
+                        zip(usage_start, get_resource_usage()))
+
+    return (0, end_time, histograms, usage, task_file_count)
+
+
+def create_leaf_directory(base_dir, leaf_dir):
+    os.makedirs(base_dir + leaf_dir, exist_ok=True)
+
+
+def remove_leaf_directory(base_dir, leaf_dir):
+    """
+    Remove leaf directory and all its parents up to 'base_dir' which became
+    empty. Parents still containing directories of other tasks are left
+    to the task which removes their last subdirectory.
+    """
+    while leaf_dir:
+        try:
+            os.rmdir(base_dir + leaf_dir)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            if e.errno in (errno.ENOTEMPTY, errno.EEXIST):
+                return
+            raise
+        leaf_dir = os.path.dirname(leaf_dir.rstrip("/"))
+
+
+directory_tree_functions = {'mkdir': create_leaf_directory,
+                            'rmdir': remove_leaf_directory}
+
 
-    total_size_to_read = sum(file_sizes.values())
+def directory_tree_benchmark(operation, subdir, task_id, file_sizes, \
+                             blocksize, test_data_dir, progress_counters, \
+                             start_barrier, file_queue):
+    """
+    Task creating ('mkdir') or removing ('rmdir') the leaf directories and
+    their parents of the directory layout in 'subdir' of the test data
+    directory
+    """
+
+    task_dir_count = 0
+
+    done_bytes = progress_counters.done_bytes
+    done_ops = progress_counters.done_ops
+    total_bytes = progress_counters.total_bytes
+
+    histograms = new_latency_histograms((operation,))
+    record_op = histograms[operation].record
+    tree_function = directory_tree_functions[operation]
+
+    base_dir = test_data_dir + "/"
+    if subdir:
+        base_dir += subdir + "/"
+    leaf_dirs = directory_layout.leaf_dirs
+
+    start_barrier.wait()
+    start_time = time.time()
+    usage_start = get_resource_usage()
+
+    for leaf_id in file_queue.files(task_id):
+        total_bytes[task_id] += 1
+        op_start = monotonic_ns()
+        tree_function(base_dir, leaf_dirs[leaf_id])
+        record_op(monotonic_ns() - op_start)
+        task_dir_count += 1
+        done_bytes[task_id] = task_dir_count
+        done_ops[task_id] = task_dir_count
+
+    end_time = time.time() - start_time
+    usage = tuple(end - start for start, end in \
+                        zip(usage_start, get_resource_usage()))
 
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_read_bytes,
-                                total_size_to_read,
-                                "???",
-                                width=40, numtype='filesize')
+    return (0, end_time, histograms, usage, task_dir_count)
+
+
+def create_directory_tree(pool, threadcount, subdir=""):
+    """
+    Create the directory layout in parallel, report and return the time
+    """
+    tree_time, threads_results = \
+        run_benchmark(pool, partial(directory_tree_benchmark, 'mkdir', subdir), \
+                      None, threadcount, 0, \
+                      filecount=directory_layout.leaf_count, numtype='normal')
+
+    print("", file=sys.stderr)
+    print("--- CREATED " + str(directory_layout.leaf_count) \
+        + " LEAF DIRECTORIES IN " + str(tree_time) + "s", file=sys.stderr)
+    print(format_latency_summary(merge_latency_histograms(threads_results)), \
+          file=sys.stderr)
+    print("", file=sys.stderr)
+    return tree_time
 
 
-    outfile = open("/dev/null", "wb")
-    start_barrier.wait()
-    start_time = time.time()
+def remove_directory_tree(pool, threadcount, subdir=""):
+    """
+    Remove the (empty) directory layout in parallel, return the time and
+    the latency histograms
+    """
+    tree_time, threads_results = \
+        run_benchmark(pool, partial(directory_tree_benchmark, 'rmdir', subdir), \
+                      None, threadcount, 0, \
+                      filecount=directory_layout.leaf_count, numtype='normal')
+    return tree_time, merge_latency_histograms(threads_results)
 
-    for i in range(len(file_ids)):
-        #
-        # Open file
-        #
-        infile = open(test_data_dir + "/" + str(file_ids[i]), "rb")
-        infile_size = file_sizes[file_ids[i]]
 
-        #
-        # Read the file in blocks
-        #
-        file_read_bytes = 0
-        
-        #
-        # Prepare a shuffled list of block indexes to read in random order
-        #
-        random_block_indexes = [i for i in range(0,int(infile_size/blocksize))]
-        random.shuffle(random_block_indexes)
-        
-        for block_index in random_block_indexes:
-            infile.seek(block_index*blocksize, 0)
-            block_read_bytes = outfile.write(infile.read(blocksize))
-            file_read_bytes += block_read_bytes
-            total_read_bytes += block_read_bytes
-            #
-            # Format progress message
-            #
-            current_throughput = \
-                humanize.naturalsize(total_read_bytes/(time.time()-start_time)) \
-                + "/s"
+#
+# Two-sided 95% critical values of Student's t distribution for 1 to 30
+# degrees of freedom, normal approximation is used above
+#
+t_distribution_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306,
+                     2.262, 2.228, 2.201, 2.179, 2.160, 2.145, 2.131, 2.120,
+                     2.110, 2.101, 2.093, 2.086, 2.080, 2.074, 2.069, 2.064,
+                     2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
 
-            thread_progress_messages[task_id] = \
-                format_progress_message("Task #" + str(task_id),
-                                        total_read_bytes,
-                                        total_size_to_read,
-                                        current_throughput,
-                                        width=40, numtype='filesize')
 
-        #
-        # Write remainder of the file
-        #
-        block_read_bytes = \
-            outfile.write(infile.read(file_sizes[file_ids[i]]-file_read_bytes))
-        total_read_bytes += block_read_bytes
+def iteration_summary_metrics(phase_throughputs, phase_latencies, \
+                              metadata_rates):
+    """
+    Collects the metrics of a single iteration compared across iterations:
+    throughput of data phases, p50 and p99 latency of each phase and rates
+    of metadata operations
+    """
+    metrics = collections.OrderedDict()
+    for phase, phase_time, phase_bytes in phase_throughputs:
+        if not math.isnan(phase_time) and phase_time > 0:
+            metrics[phase + " THROUGHPUT [MB/s]"] = phase_bytes/phase_time/1e6
+    for phase in latency_phase_labels:
+        histogram = phase_latencies.get(phase)
+        if histogram is None or histogram.total_count() == 0:
+            continue
+        for p in (50.0, 99.0):
+            metrics[phase + " P%g [us]" % p] = \
+                                    histogram.value_at_percentile(p)/1e3
+    for op, rate in metadata_rates.items():
+        metrics["MD " + op.upper() + " [ops/s]"] = rate
+    return metrics
+
+
+def summarize_samples(values):
+    """
+    Returns mean, standard deviation, minimum, maximum, the 95% confidence
+    interval of the mean and the indexes of outliers of the values.
 
-    outfile.close()
-    end_time = time.time() - start_time
-    current_throughput = \
-        humanize.naturalsize(total_read_bytes/(time.time()-start_time)) \
-        + "/s"
-    thread_progress_messages[task_id] = \
-        format_progress_message("Task #" + str(task_id),
-                                total_read_bytes,
-                                total_size_to_read,
-                                current_throughput,
-                                width=40, numtype='filesize')
-    thread_results[task_id] = (total_read_bytes, end_time)
+    Outliers are values with modified z-score (based on median absolute
+    deviation) above 3.5.
+    """
+    n = len(values)
+    mean = sum(values) / n
+    stddev = math.sqrt(sum((v - mean)**2 for v in values) / (n - 1))
+    t = t_distribution_95[n - 2] if n - 1 <= len(t_distribution_95) else 1.96
+    half_width = t * stddev / math.sqrt(n)
+
+    ordered = sorted(values)
+    median = (ordered[(n - 1)//2] + ordered[n//2]) / 2
+    deviations = sorted(abs(v - median) for v in values)
+    mad = (deviations[(n - 1)//2] + deviations[n//2]) / 2
+    outliers = []
+    if mad > 0:
+        outliers = [i for i, v in enumerate(values) \
+                    if 0.6745 * abs(v - median) / mad > 3.5]
+
+    return mean, stddev, ordered[0], ordered[-1], \
+           (mean - half_width, mean + half_width), outliers
+
+
+def format_repeat_summary(iteration_metrics):
+    """
+    Formats the statistics of each metric measured in at least 2 iterations
+    """
+    lines = []
+    names = []
+    for metrics in iteration_metrics:
+        names.extend(name for name in metrics if name not in names)
+    for name in names:
+        iterations = [i for i, metrics in enumerate(iteration_metrics) \
+                      if name in metrics]
+        if len(iterations) < 2:
+            continue
+        values = [iteration_metrics[i][name] for i in iterations]
+        mean, stddev, low, high, ci, outliers = summarize_samples(values)
+        line = "--- %s: mean=%.1f, stddev=%.1f, min=%.1f, max=%.1f," \
+               " 95%% CI=[%.1f, %.1f]" % (name, mean, stddev, low, high,
+                                          ci[0], ci[1])
+        if outliers:
+            line += ", OUTLIERS IN ITERATIONS: " \
+                    + ", ".join(str(iterations[i] + 1) for i in outliers)
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def metadata_csv_labels():
+    """
+    Returns the CSV column labels for the rates of metadata operations
+    """
+    return ["MD " + op.upper() + " [ops/s]" for op in metadata_operations]
 
 
 if __name__ == '__main__':
@@ -689,9 +3532,16 @@ Defaults to hostname.""",
         action="store_true", dest="readonly",
         help="""This test will only perform read tests.
 It assumes that the current folder contains 'naive-bench-data' folder
-with test files uniformly numbered in the specified range.""",
+with test files uniformly numbered in the specified range. Sizes of the
+files are loaded from the dataset manifest of the run which created them.""",
         default=False)
 
+    parser.add_option('--incremental',
+        action="store_true", dest="incremental",
+        help="""Reuse the files kept by a previous run, creating only the
+files missing in its dataset manifest or not matching the requested file
+size.""", default=False)
+
     parser.add_option('-w', '--write-only',
         action="store_true", dest="writeonly",
         help="""This test will only perform write tests.
@@ -713,6 +3563,144 @@ consecutive write benchmarks work with empty files.""", default=False)
 size is too small.""",
         default=False)
 
+    parser.add_option('-x', '--mixed',
+        action="store_true", dest="mixed",
+        help="""Run a mixed read/write benchmark on the created files after
+the read benchmarks. Written files are flushed according to --sync, with
+'file' mode when they are closed. Requests are issued one at a time
+regardless of --iodepth.""",
+        default=False)
+
+    parser.add_option('--read-ratio', type='float',
+        action="store", dest="readratio",
+        help="""Percentage of read operations in the mixed benchmark.
+Default: 70.""",
+        default=70.0)
+
+    parser.add_option('--mixed-blocksizes', type='string',
+        action="store", dest="mixedblocksizes",
+        help="""Comma separated list of block sizes used by the mixed
+benchmark with optional weights, e.g. '4KiB:70,1MiB:30'. Default: blocksize.""",
+        default=None)
+
+    parser.add_option('--mixed-ops', type='int',
+        action="store", dest="mixedops",
+        help="""Number of operations of the mixed benchmark (unless runtime
+is set). Default: number of blocks in all files.""",
+        default=0)
+
+    parser.add_option('--distribution', type='choice',
+        choices=['uniform', 'zipf', 'hotspot'],
+        action="store", dest="distribution",
+        help="""Distribution of accesses of the mixed benchmark over the
+blocks of all files (uniform, zipf, hotspot). Default: uniform.""",
+        default='uniform')
+
+    parser.add_option('--zipf-theta', type='float',
+        action="store", dest="zipftheta",
+        help="""Exponent of the zipf distribution. Default: 1.2.""",
+        default=1.2)
+
+    parser.add_option('--hotspot', type='string',
+        action="store", dest="hotspot",
+        help="""Fractions of data and accesses of the hotspot distribution,
+e.g. '0.2:0.8' sends 80% of accesses to 20% of the blocks. Default: 0.2:0.8.""",
+        default='0.2:0.8')
+
+    parser.add_option('--data-pool-size', type='string',
+        action="store", dest="datapoolsize",
+        help="""Size of the pool of pregenerated data shared by all workers,
+from which the written blocks are taken. Default: 32MiB.""",
+        default='32MiB')
+
+    parser.add_option('--compress-ratio', type='float',
+        action="store", dest="compressratio",
+        help="""Compression ratio of the written data, e.g. 2 makes half of
+each 4KiB chunk zeros. Default: 1 (incompressible).""",
+        default=1.0)
+
+    parser.add_option('--dedup-ratio', type='float',
+        action="store", dest="dedupratio",
+        help="""Deduplication ratio of the written data, e.g. 2 makes half of
+the written blocks duplicates. Default: 1 (unique blocks).""",
+        default=1.0)
+
+    parser.add_option('--repeat', type='int',
+        action="store", dest="repeat",
+        help="""Repeat the benchmark the given number of times reusing the
+created files and report statistics of throughput and latency of each phase
+over all iterations. Default: 1.""",
+        default=1)
+
+    parser.add_option('--runtime', type='float',
+        action="store", dest="runtime",
+        help="""Run each data phase for the given number of seconds (after
+the warmup) cycling over the files, instead of accessing each file once.
+File creation is not time-bounded and always creates all files. Default: 0.""",
+        default=0.0)
+
+    parser.add_option('--warmup', type='float',
+        action="store", dest="warmup",
+        help="""Exclude the first given number of seconds of each data phase
+except file creation from all its measurements. Default: 0.""",
+        default=0.0)
+
+    parser.add_option('--steady-state',
+        action="store_true", dest="steadystate",
+        help="""Detect when the throughput of each data phase becomes stable
+and report the steady state throughput separately.""",
+        default=False)
+
+    parser.add_option('--agent', type='string',
+        action="store", dest="agent",
+        help="""Run as an agent listening on [HOST:]PORT (HOST defaults to
+127.0.0.1), which executes the benchmark phases sent by a coordinator.
+Agents should be started in different directories. All other options are
+taken from the coordinator.""",
+        default=None)
+
+    parser.add_option('--agents', type='string',
+        action="store", dest="agents",
+        help="""Run as a coordinator of agents at comma separated list of
+HOST:PORT addresses. Each phase starts on all agents at the same moment,
+and throughput and latencies are aggregated over all agents.""",
+        default=None)
+
+    parser.add_option('--agent-key', type='string',
+        action="store", dest="agentkey",
+        help="""Authentication key of connections between the coordinator
+and agents, required with --agent and --agents. Default: the value of
+NAIVE_BENCH_AGENT_KEY environment variable.""",
+        default=os.environ.get('NAIVE_BENCH_AGENT_KEY'))
+
+    parser.add_option('--dir-depth', type='int',
+        action="store", dest="dirdepth",
+        help="""Depth of the directory tree holding the test files, 0 stores
+all files directly in the test folder. Default: 0.""",
+        default=0)
+
+    parser.add_option('--dir-fanout', type='int',
+        action="store", dest="dirfanout",
+        help="""Number of subdirectories of each directory in the directory
+tree. Default: 10.""",
+        default=10)
+
+    parser.add_option('--dir-layout', type='choice',
+        choices=['shared', 'private'],
+        action="store", dest="dirlayout",
+        help="""Whether all tasks share the directory tree or each task has
+its own private subtree (shared, private). With private subtrees tasks do not
+take over files of other tasks when they run out of their own, and sweeps
+with fewer workers give each worker whole subtrees. Default: shared.""",
+        default='shared')
+
+    parser.add_option('-m', '--metadata-files', type='int',
+        action="store", dest="mdfilecount",
+        help="""Number of empty files used by the metadata benchmark, which
+measures create, stat, open/close, rename, utime and unlink rates. The
+metadata benchmark is skipped when set to 0. Default: 0.""",
+        default=0)
+
     parser.add_option('-d', '--deviation', type='float',
         action="store", dest="deviation",
         help="""Generate the files with random size in range
@@ -724,11 +3712,157 @@ size is too small.""",
         help="""Number of threads to execute for each test.""",
         default=4)
 
+    parser.add_option('--worker-type', type='choice',
+        choices=['process', 'thread'],
+        action="store", dest="workertype",
+        help="""Run each benchmark task in a separate process or in a thread
+of a single process (process, thread). Default: process.""",
+        default='process')
+
+    parser.add_option('-q', '--iodepth', type='int',
+        action="store", dest="iodepth",
+        help="""Number of block requests kept in flight by each task
+using a thread pool. Default: 1.""",
+        default=1)
+
+    parser.add_option('--rate', type='string',
+        action="store", dest="rate",
+        help="""Issue block requests of the data phases at a target rate in
+requests per second, or in bytes per second with a size suffix (e.g.
+100MB), on a fixed timetable. Latencies are measured from the scheduled
+start of each request. Default: as fast as possible.""",
+        default=None)
+
+    parser.add_option('--rate-scope', type='choice',
+        choices=['global', 'worker'],
+        action="store", dest="ratescope",
+        help="""Whether the target rate is the total rate of all workers
+or the rate of each worker (global, worker). Default: global.""",
+        default='global')
+
+    parser.add_option('--rate-sweep', type='string',
+        action="store", dest="ratesweep",
+        help="""Comma separated list of target rates at which the random read
+benchmark is run again, to report latency against throughput.""",
+        default=None)
+
+    parser.add_option('--sweep-blocksizes', type='string',
+        action="store", dest="sweepblocksizes",
+        help="""Comma separated list of block sizes at which the read
+benchmarks are run again on the created dataset, for each number of
+workers of the sweep. Default: the block size.""",
+        default=None)
+
+    parser.add_option('--sweep-threads', type='string',
+        action="store", dest="sweepthreads",
+        help="""Comma separated list of numbers of workers, at most the
+thread count, at which the read benchmarks are run again on the created
+dataset, for each block size of the sweep. Default: the thread count.""",
+        default=None)
+
+    parser.add_option('--sweep-rewrite',
+        action="store_true", dest="sweeprewrite",
+        help="""Run also the random write benchmark in each step of the
+block size and worker count sweep.""",
+        default=False)
+
+    parser.add_option('--sweep-csv', type='string',
+        action="store", dest="sweepcsv",
+        help="""Write throughput and latency of each step of the block size
+and worker count sweep with the knee points to a CSV file.""",
+        default=None)
+
+    parser.add_option('--cpu-affinity', type='string',
+        action="store", dest="cpuaffinity",
+        help="""Pin each benchmark worker to a single CPU from the list,
+in the format of taskset (e.g. 0-3,8), to make the CPU cost reproducible.
+Worker i runs on the i-th CPU of the list modulo its length.""",
+        default=None)
+
     parser.add_option('-P', '--no-purge',
         action="store_true", dest="nopurge",
         help="""If specified, disables cache clearing between steps.""",
         default=False)
 
+    parser.add_option('--evict', type='choice',
+        choices=['drop', 'fadvise'],
+        action="store", dest="evict",
+        help="""Method of clearing the cache between steps: drop the whole
+page cache of the host (requires sudo) or evict only the test files with
+posix_fadvise, in parallel by the workers (drop, fadvise). Default: drop.""",
+        default='drop')
+
+    parser.add_option('--hot-cache',
+        action="store_true", dest="hotcache",
+        help="""After each read benchmark, pre-read the test files into the
+page cache and run the benchmark again to compare cold and warm cache
+throughput.""",
+        default=False)
+
+    parser.add_option('-S', '--sync', type='choice',
+        choices=['none', 'block', 'file', 'phase'],
+        action="store", dest="syncmode",
+        help="""Flush written data to stable storage after each block,
+after each file or at the end of each write phase (none, block, file, phase).
+Sync latency is reported separately. Default: none.""",
+        default='none')
+
+    parser.add_option('--sync-method', type='choice',
+        choices=['fsync', 'fdatasync'],
+        action="store", dest="syncmethod",
+        help="""System call used to flush the data (fsync, fdatasync).
+Default: fsync.""",
+        default='fsync')
+
+    parser.add_option('--open-sync', type='choice',
+        choices=['none', 'osync', 'odsync'],
+        action="store", dest="opensync",
+        help="""Open files for writing with O_SYNC or O_DSYNC flag
+(none, osync, odsync). Default: none.""",
+        default='none')
+
+    parser.add_option('-e', '--engine', type='choice',
+        choices=sorted(set(file_engines.keys()) - {'null'}),
+        action="store", dest="engine",
+        help="""I/O engine used for accessing files: 'psync' uses pread and
+pwrite system calls, 'mmap' maps files into memory and copies blocks
+through memoryviews. Default: psync.""",
+        default='psync')
+
+    parser.add_option('--calibrate',
+        action="store_true", dest="calibrate",
+        help="""Before the benchmark, run the data phases without any I/O
+on the local node and report the ceiling of the benchmark itself
+in operations and bytes per second next to each phase.""",
+        default=False)
+
+    parser.add_option('--profile', type='string',
+        action="store", dest="profile",
+        help="""Profile each benchmark worker with cProfile and write the
+statistics of each benchmark and worker to the directory.""",
+        default=None)
+
+    parser.add_option('--madvise', type='choice',
+        choices=['none'] + sorted(madvise_hints.keys()),
+        action="store", dest="madvise",
+        help="""Memory access hint given to the kernel for files mapped
+by mmap engine (none, random, sequential, willneed). Default: none.""",
+        default='none')
+
+    parser.add_option('--verify',
+        action="store_true", dest="verify",
+        help="""Stamp each written block with a header holding the file id,
+block index, generation and checksum of the block and verify it when
+the block is read.""",
+        default=False)
+
+    parser.add_option('-D', '--direct',
+        action="store_true", dest="direct",
+        help="""Use direct I/O (O_DIRECT) with page aligned buffers,
+bypassing the page cache. Implies --no-purge. Blocksize must be a multiple
+of the page size.""",
+        default=False)
+
     #
     # Parse the command line
     #
@@ -739,7 +3873,7 @@ size is too small.""",
     blocksize = parse_file_size(options.blocksize)
     deviation = options.deviation
     threadcount = options.threadcount
-    dropcaches = not options.nopurge
+    dropcaches = not options.nopurge and not options.direct
 
     if math.isnan(filesize):
         print("Invalid filesize - exiting.", file=sys.stderr)
@@ -758,16 +3892,61 @@ size is too small.""",
               file=sys.stderr)
         sys.exit(2)
 
+    if options.iodepth < 1:
+        print("I/O depth must be at least 1 - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    if options.iodepth > 1 and options.syncmode == 'block':
+        print("Sync after each block cannot be used with I/O depth larger" \
+              " than 1 - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    if options.iodepth > 1 and options.mixed:
+        print("Mixed benchmark issues one request at a time, I/O depth" \
+              " is ignored by it.", file=sys.stderr)
+
+    if options.direct and not hasattr(os, 'O_DIRECT'):
+        print("Direct I/O is not supported on this platform - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    if options.direct and options.engine == 'mmap':
+        print("Direct I/O cannot be used with mmap engine - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    if options.direct and blocksize % direct_io_alignment != 0:
+        print("Blocksize must be a multiple of %d bytes for direct I/O" \
+              " - exiting." % direct_io_alignment, file=sys.stderr)
+        sys.exit(2)
+
     if deviation < 0.0 or deviation > 0.9:
         print("Deviation must be in range [0.0, 0.9] - exiting.", \
               file=sys.stderr)
         sys.exit(2)
 
-    if threadcount>filecount or filecount%threadcount != 0:
-        print("Total file count must be a multiple of thread count - exiting.", \
+    if threadcount > filecount:
+        print("Thread count must not be larger than file count - exiting.", \
               file=sys.stderr)
         sys.exit(2)
 
+    #
+    # Agents run any code sent by a coordinator which knows the key, so
+    # there is no default key
+    #
+    if (options.agent or options.agents) and not options.agentkey:
+        print("Agent key must be given with --agent-key or" \
+              " NAIVE_BENCH_AGENT_KEY - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    #
+    # In agent mode the benchmark is driven by the coordinator
+    #
+    if options.agent:
+        run_agent(parse_address(options.agent, '127.0.0.1'), \
+                  options.agentkey.encode())
+        sys.exit(0)
+
     #
     # Calculate available disk space on the current volume
     #
@@ -796,7 +3975,7 @@ size is too small.""",
     # Check available disk space for test
     #
     if (filesize * filecount * (1.0+deviation)) > available_disk_space \
-                                                 and not options.force:
+                                and not options.force and not options.agents:
         print("Not enough disk space to perform test - exiting.", \
               file=sys.stderr)
         sys.exit(1)
@@ -813,254 +3992,826 @@ size is too small.""",
         print("Cannot perform test with no files - exiting.", file=sys.stderr)
         sys.exit(2)
 
+    if options.mixedblocksizes:
+        mixed_block_sizes = \
+                parse_block_size_distribution(options.mixedblocksizes)
+    else:
+        mixed_block_sizes = ([blocksize], [1.0])
+
+    if any(math.isnan(size) or size < 1 for size in mixed_block_sizes[0]) \
+            or min(mixed_block_sizes[1]) < 0 or sum(mixed_block_sizes[1]) <= 0:
+        print("Invalid mixed block sizes - exiting.", file=sys.stderr)
+        sys.exit(2)
+    mixed_block_sizes = ([int(size) for size in mixed_block_sizes[0]], \
+                         mixed_block_sizes[1])
+
+    if options.direct and \
+            any(size % direct_io_alignment for size in mixed_block_sizes[0]):
+        print("Mixed block sizes must be multiples of %d bytes for direct" \
+              " I/O - exiting." % direct_io_alignment, file=sys.stderr)
+        sys.exit(2)
+
+    if options.evict == 'fadvise' and not hasattr(os, 'posix_fadvise'):
+        print("Evicting files with posix_fadvise is not supported on " \
+              + sys.platform + " - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    if options.hotcache and options.direct:
+        print("Hot cache reads are not possible with direct I/O - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    if options.readratio < 0.0 or options.readratio > 100.0:
+        print("Read ratio must be in range [0, 100] - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    try:
+        options.hotdata, options.hotaccess = \
+                        (float(f) for f in options.hotspot.split(':'))
+    except ValueError:
+        options.hotdata, options.hotaccess = float('NaN'), float('NaN')
+    if not (0.0 < options.hotdata < 1.0 and 0.0 < options.hotaccess < 1.0):
+        print("Hotspot fractions must be in range (0, 1) - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    options.cpus = None
+    if options.cpuaffinity:
+        if not hasattr(os, 'sched_setaffinity'):
+            print("CPU affinity is not supported on " + sys.platform \
+                  + " - exiting.", file=sys.stderr)
+            sys.exit(2)
+        try:
+            options.cpus = parse_cpu_list(options.cpuaffinity)
+        except ValueError:
+            options.cpus = []
+        if not options.cpus \
+                or not set(options.cpus) <= os.sched_getaffinity(0):
+            print("Invalid CPU list - exiting.", file=sys.stderr)
+            sys.exit(2)
+
+    data_pool_size = parse_file_size(options.datapoolsize)
+    if math.isnan(data_pool_size) or data_pool_size < 1:
+        print("Invalid data pool size - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    if not (options.compressratio >= 1.0 and options.dedupratio >= 1.0):
+        print("Compression and dedup ratios must be at least 1 - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    if options.zipftheta <= 0.0:
+        print("Zipf exponent must be positive - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    if options.repeat < 1:
+        print("Repeat count must be at least 1 - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    if options.runtime < 0 or options.warmup < 0:
+        print("Runtime and warmup must not be negative - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    if options.dirdepth < 0 or options.dirfanout < 1:
+        print("Directory tree depth must not be negative and fan-out must" \
+              " be at least 1 - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    if options.mdfilecount < 0:
+        print("Metadata file count must not be negative - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    target_rate = 0.0
+    if options.rate:
+        target_rate = parse_rate(options.rate, blocksize)
+    sweep_rates = []
+    if options.ratesweep:
+        sweep_rates = [parse_rate(rate, blocksize) \
+                       for rate in options.ratesweep.split(',')]
+    if not all(rate > 0 for rate in \
+               sweep_rates + ([target_rate] if options.rate else [])):
+        print("Invalid target rate - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    sweep_blocksizes, sweep_workercounts = [], []
+    if options.sweepblocksizes or options.sweepthreads:
+        sweep_blocksizes = [blocksize]
+        if options.sweepblocksizes:
+            sweep_blocksizes = [parse_file_size(size) \
+                                for size in options.sweepblocksizes.split(',')]
+        try:
+            sweep_workercounts = [int(workers) for workers in \
+                                  (options.sweepthreads or '').split(',') \
+                                  if workers] or [threadcount]
+        except ValueError:
+            sweep_workercounts = [0]
+
+    if any(math.isnan(size) or not 1 <= size <= filesize \
+           for size in sweep_blocksizes):
+        print("Sweep block sizes must be in range [1, filesize] - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+    sweep_blocksizes = [int(size) for size in sweep_blocksizes]
+
+    if any(not 1 <= workers <= threadcount for workers in sweep_workercounts):
+        print("Sweep numbers of workers must be in range [1, %d]" \
+              " - exiting." % threadcount, file=sys.stderr)
+        sys.exit(2)
+
+    if options.direct and \
+            any(size % direct_io_alignment for size in sweep_blocksizes):
+        print("Sweep block sizes must be multiples of %d bytes for direct" \
+              " I/O - exiting." % direct_io_alignment, file=sys.stderr)
+        sys.exit(2)
+
+    if sweep_blocksizes and (options.verify or options.rate):
+        print("Block size and worker count sweep cannot be used with" \
+              " --verify or --rate - exiting.", file=sys.stderr)
+        sys.exit(2)
+
+    if options.verify and options.calibrate:
+        print("Null engine cannot be used with --verify - exiting.", \
+              file=sys.stderr)
+        sys.exit(2)
+
+    tree_create_time = float('NaN')
+    iteration_metrics = []
+
+
+    directory_layout = DirectoryLayout(options.dirdepth, options.dirfanout, \
+                                       options.dirlayout == 'private', \
+                                       threadcount)
+
+    block_verifier = BlockVerifier(filecount, blocksize) \
+                     if options.verify else None
+    task_rate = RawValue('d', 0.0)
+
     #
-    # Initialize time variables
+    # Generate the written data before the workers are started, so that
+    # all of them share it
     #
-    create_files_time = float('NaN')
-    create_files_bytes_size = 0
-    overwrite_files_time = float('NaN')
-    overwrite_files_bytes_size = 0
-    linear_read_time = float('NaN')
-    linear_read_bytes_size = 0
-    random_read_time = float('NaN')
-    random_read_bytes_size = 0
-    delete_time = float('NaN')
+    start_time = time.time()
+    data_pool = DataPool(int(data_pool_size), \
+                         max([blocksize] + mixed_block_sizes[0] \
+                             + sweep_blocksizes), \
+                         options.compressratio, options.dedupratio)
+    print("\n--- GENERATED " + humanize.naturalsize(data_pool.size, True) \
+          + " DATA POOL IN " + str(time.time() - start_time) + "s" \
+          + " (compression ratio %.1f, dedup ratio %.1f)" \
+          % (data_pool.compress_ratio, data_pool.dedup_ratio), \
+          file=sys.stderr)
 
+    #
+    # Measure the ceiling of the benchmark harness before the real phases
+    #
+    harness_ceilings = {}
+    if options.calibrate:
+        harness_ceilings = \
+            run_harness_calibration(threadcount, \
+                                    random_file_sizes(filecount, filesize, \
+                                                      deviation), \
+                                    blocksize)
 
-    print("\n\nCreating test folder 'naive-bench-data'...", end="", \
-           file=sys.stderr)
     #
-    # Cleanup old test data
+    # Start the benchmark worker processes, which are reused by all phases,
+    # or connect to the agents running them
     #
-    system("rm -rf naive-bench-data")
-    starttime = time.time()
-    system("mkdir naive-bench-data")
-    endtime = time.time() - starttime
-    print("DONE [%d s]\n"%(endtime), file=sys.stderr)
+    if options.agents:
+        pool = RemotePool([parse_address(address, 'localhost') \
+                           for address in options.agents.split(',')], \
+                          threadcount, \
+                          (options, directory_layout, mixed_block_sizes, \
+                           data_pool, block_verifier), \
+                          options.agentkey.encode())
+    else:
+        pool = WorkerPool(threadcount, options.workertype, filecount)
+    nodecount = pool.nodecount
 
-    if dropcaches:
-        print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
-        drop_caches()
-        print(" DONE", file=sys.stderr)
+    #
+    # Global target rate is divided among all tasks of all nodes
+    #
+    rate_divisor = pool.threadcount if options.ratescope == 'global' else 1
+    pool.call(set_task_rate, target_rate / rate_divisor)
+
+    #
+    # Read-only and incremental runs reuse the dataset described by the
+    # manifest of a previous run
+    #
+    manifest_file_sizes = None
+    if options.readonly or options.incremental:
+        manifest = pool.call(read_manifest)[0]
+        if manifest is not None:
+            manifest_file_sizes, verify_blocksize = manifest
+            #
+            # Verification headers are stamped at the block boundaries of
+            # the run which wrote the files
+            #
+            if options.verify and verify_blocksize \
+                    and verify_blocksize != blocksize:
+                print("Dataset was verified with block size " \
+                      + str(verify_blocksize) + ", it cannot be verified " \
+                      + "with block size " + str(blocksize) + " - exiting.", \
+                      file=sys.stderr)
+                pool.close()
+                sys.exit(2)
+
+    if not options.readonly and manifest_file_sizes is None:
+        print("\n\nCreating test folder 'naive-bench-data'...", end="", \
+               file=sys.stderr)
+        #
+        # Cleanup old test data
+        #
+        endtime = max(pool.call(create_test_data_dir))
+        print("DONE [%d s]\n"%(endtime), file=sys.stderr)
+
+    if directory_layout.has_directories() and not options.readonly:
+        print("\n--- CREATING DIRECTORY TREE...\n", file=sys.stderr)
+        tree_create_time = create_directory_tree(pool, threadcount)
 
-    ##########
     #
-    # Start file creation benchmark
+    # Sizes of the files are drawn once and used by all phases, files of the
+    # manifest matching the requested size are not created again
     #
+    file_sizes = random_file_sizes(filecount, filesize, deviation)
+    create_file_ids = None
+    if options.readonly:
+        if manifest_file_sizes is not None \
+                and len(manifest_file_sizes) >= filecount:
+            file_sizes = manifest_file_sizes[:filecount]
+        else:
+            file_sizes = pool.call(existing_file_sizes, filecount, \
+                                   __test_data_dir)[0]
+    elif manifest_file_sizes is not None:
+        create_file_ids = []
+        for file_id in range(filecount):
+            if file_id < len(manifest_file_sizes) \
+                    and abs(manifest_file_sizes[file_id] - filesize) \
+                        <= filesize * deviation + 1:
+                file_sizes[file_id] = manifest_file_sizes[file_id]
+            else:
+                create_file_ids.append(file_id)
+        print("\n--- REUSING " + str(filecount - len(create_file_ids)) \
+              + " FILES OF THE DATASET MANIFEST", file=sys.stderr)
+
     #
-    if not options.readonly:
-        threads = []
-        threads_results = process_manager.dict()
-        threads_progress_messages = process_manager.dict()
-        print("\n--- INITIALIZING FILE CREATION BENCHMARK...\n", file=sys.stderr)
-        
-        create_files_time = run_benchmark(file_create_benchmark, \
-                                        filecount, threadcount, deviation, \
-                                        blocksize, threads_results, \
-                                        threads_progress_messages)
+    # The sizes are passed to the workers once, not with each phase
+    #
+    pool.set_file_sizes(file_sizes)
+
+    if dropcaches:
+        print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
+        evict_caches(pool, filecount)
+        print(" DONE", file=sys.stderr)
+
+    for iteration in range(options.repeat):
+        if options.repeat > 1:
+            print("\n--- ITERATION %d OF %d" % (iteration + 1, options.repeat), \
+                  file=sys.stderr)
 
         #
-        # Calculate total benchmark size and time
+        # Initialize time variables
         #
-        create_files_bytes_size = sum(s[0] for s in threads_results.values())
+        create_files_time = float('NaN')
+        create_files_bytes_size = 0
+        random_write_time = float('NaN')
+        random_write_bytes_size = 0
+        overwrite_files_time = float('NaN')
+        overwrite_files_bytes_size = 0
+        linear_read_time = float('NaN')
+        linear_read_bytes_size = 0
+        random_read_time = float('NaN')
+        random_read_bytes_size = 0
+        mixed_time = float('NaN')
+        mixed_bytes_size = 0
+        delete_time = float('NaN')
+        delete_rate = float('NaN')
+        metadata_rates = {}
+        phase_latencies = {}
+        phase_page_faults = {}
+        phase_cpu = {}
 
-        print("", file=sys.stderr)
-        print("--- CREATED " + str(filecount) + " FILES OF TOTAL SIZE " \
-            + str(humanize.naturalsize(create_files_bytes_size)) + " IN " \
-            + str(create_files_time) + "s", file=sys.stderr)
-        print("--- THROUGHPUT: " \
-            + str(humanize.naturalsize(create_files_bytes_size/create_files_time))\
-            + "/s", file=sys.stderr)
-        print("", file=sys.stderr)
+        ##########
+        #
+        # Start file creation benchmark, later iterations reuse the files
+        # created in the first one
+        #
+        if not options.readonly and iteration == 0 \
+                and (create_file_ids is None or create_file_ids):
+            print("\n--- INITIALIZING FILE CREATION BENCHMARK...\n", file=sys.stderr)
+
+            create_benchmark = file_create_benchmark
+            create_filecount = filecount
+            if create_file_ids is not None:
+                create_benchmark = partial(file_create_benchmark, \
+                                           file_ids=create_file_ids)
+                create_filecount = len(create_file_ids)
+        
+            create_files_time, threads_results = \
+                run_benchmark(pool, create_benchmark, file_sizes, \
+                              threadcount, blocksize, \
+                              filecount=create_filecount)
+            pool.call(write_manifest, file_sizes)
 
-        if dropcaches:
-            print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
-            drop_caches()
-            print(" DONE", file=sys.stderr)
+            #
+            # Calculate total benchmark size and time
+            #
+            create_files_bytes_size = sum(s[0] for s in threads_results)
+            create_files_count = sum(s[4] for s in threads_results)
+            create_files_latency = merge_latency_histograms(threads_results)
+            phase_latencies["CREATE"] = create_files_latency['write']
+            phase_page_faults["CREATE"] = merge_page_faults(threads_results)
+            phase_latencies["CREATE SYNC"] = create_files_latency['sync']
+
+            print("", file=sys.stderr)
+            print("--- CREATED " + str(create_files_count) + " FILES OF TOTAL SIZE " \
+                + str(humanize.naturalsize(create_files_bytes_size)) + " IN " \
+                + str(create_files_time) + "s", file=sys.stderr)
+            print("--- THROUGHPUT: " \
+                + str(humanize.naturalsize(create_files_bytes_size/create_files_time))\
+                + "/s", file=sys.stderr)
+            print(format_latency_summary(create_files_latency), file=sys.stderr)
+            print(format_page_faults_summary(phase_page_faults["CREATE"]), \
+                  file=sys.stderr)
+            phase_cpu["CREATE"] = (merge_cpu_usage(threads_results), \
+                create_files_bytes_size, phase_latencies["CREATE"].total_count())
+            print(format_cpu_summary(*phase_cpu["CREATE"]), file=sys.stderr)
+            if "CREATE" in harness_ceilings:
+                print(format_harness_load(harness_ceilings["CREATE"], \
+                          phase_cpu["CREATE"][2] / create_files_time / nodecount), \
+                      file=sys.stderr)
+            print(format_task_skew_summary(threads_results), file=sys.stderr)
+            print("", file=sys.stderr)
+
+            if dropcaches:
+                print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
+                evict_caches(pool, filecount)
+                print(" DONE", file=sys.stderr)
 
         ##########
         #
         # Start file random write benchmark
         #
         #
-        threads = []
-        threads_results = process_manager.dict()
-        threads_progress_messages = process_manager.dict()
-        print("\n--- INITIALIZING FILE RANDOM WRITE BENCHMARK...\n", file=sys.stderr)
+        if not options.readonly:
+            print("\n--- INITIALIZING FILE RANDOM WRITE BENCHMARK...\n", file=sys.stderr)
+        
+            random_write_time, threads_results = \
+                run_benchmark(pool, file_random_write_benchmark, \
+                              file_sizes, \
+                              threadcount, blocksize, \
+                              time_bounded=True)
+
+            #
+            # Calculate total benchmark size and time
+            #
+            random_write_bytes_size = sum(s[0] for s in threads_results)
+            random_write_files_count = sum(s[4] for s in threads_results)
+            random_write_latency = \
+                                merge_latency_histograms(threads_results)
+            phase_latencies["RANDOM WRITE"] = random_write_latency['write']
+            phase_page_faults["RANDOM WRITE"] = merge_page_faults(threads_results)
+            phase_latencies["RANDOM WRITE SYNC"] = random_write_latency['sync']
+
+            print("", file=sys.stderr)
+            print("--- WRITTE " + str(random_write_files_count) + " FILES WITH TOTAL SIZE" \
+                + str(humanize.naturalsize(random_write_bytes_size)) + " IN " \
+                + str(random_write_time) + "s", file=sys.stderr)
+            print("--- THROUGHPUT: " \
+                + str(humanize.naturalsize(\
+                                    random_write_bytes_size/random_write_time)) \
+                + "/s", file=sys.stderr)
+            print(format_latency_summary(random_write_latency), file=sys.stderr)
+            print(format_page_faults_summary(phase_page_faults["RANDOM WRITE"]), \
+                  file=sys.stderr)
+            phase_cpu["RANDOM WRITE"] = (merge_cpu_usage(threads_results), \
+                random_write_bytes_size, phase_latencies["RANDOM WRITE"].total_count())
+            print(format_cpu_summary(*phase_cpu["RANDOM WRITE"]), file=sys.stderr)
+            if "RANDOM WRITE" in harness_ceilings:
+                print(format_harness_load(harness_ceilings["RANDOM WRITE"], \
+                          phase_cpu["RANDOM WRITE"][2] / random_write_time / nodecount), \
+                      file=sys.stderr)
+            print(format_task_skew_summary(threads_results), file=sys.stderr)
+            print("", file=sys.stderr)
+        
+            if dropcaches:
+                print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
+                evict_caches(pool, filecount)
+                print(" DONE", file=sys.stderr)
+
+            ##########
+            #
+            # Start file overwrite benchmark
+            #
+            #
+            print("\n--- INITIALIZING FILE WRITE BENCHMARK...\n", file=sys.stderr)
+        
+            overwrite_files_time, threads_results = \
+                run_benchmark(pool, file_write_benchmark, \
+                              file_sizes, \
+                              threadcount, blocksize, \
+                              time_bounded=True)
+
+            #
+            # Calculate total benchmark size and time
+            #
+            overwrite_files_bytes_size = sum(s[0] for s in threads_results)
+            overwrite_files_count = sum(s[4] for s in threads_results)
+            overwrite_files_latency = \
+                                merge_latency_histograms(threads_results)
+            phase_latencies["WRITE"] = overwrite_files_latency['write']
+            phase_page_faults["WRITE"] = merge_page_faults(threads_results)
+            phase_latencies["WRITE SYNC"] = overwrite_files_latency['sync']
+
+            print("", file=sys.stderr)
+            print("--- OVERWRITTEN " + str(overwrite_files_count) + " FILES WITH TOTAL SIZE" \
+                + str(humanize.naturalsize(overwrite_files_bytes_size)) + " IN " \
+                + str(overwrite_files_time) + "s", file=sys.stderr)
+            print("--- THROUGHPUT: " \
+                + str(humanize.naturalsize(\
+                                    overwrite_files_bytes_size/overwrite_files_time)) \
+                + "/s", file=sys.stderr)
+            print(format_latency_summary(overwrite_files_latency), file=sys.stderr)
+            print(format_page_faults_summary(phase_page_faults["WRITE"]), \
+                  file=sys.stderr)
+            phase_cpu["WRITE"] = (merge_cpu_usage(threads_results), \
+                overwrite_files_bytes_size, phase_latencies["WRITE"].total_count())
+            print(format_cpu_summary(*phase_cpu["WRITE"]), file=sys.stderr)
+            if "WRITE" in harness_ceilings:
+                print(format_harness_load(harness_ceilings["WRITE"], \
+                          phase_cpu["WRITE"][2] / overwrite_files_time / nodecount), \
+                      file=sys.stderr)
+            print(format_task_skew_summary(threads_results), file=sys.stderr)
+            print("", file=sys.stderr)
         
-        overwrite_files_time = run_benchmark(file_random_write_benchmark, \
-                                            filecount, threadcount, deviation, \
-                                            blocksize, threads_results, \
-                                            threads_progress_messages)
+            if dropcaches:
+                print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
+                evict_caches(pool, filecount)
+                print(" DONE", file=sys.stderr)
 
+
+        ##########
         #
-        # Calculate total benchmark size and time
+        # Start linear read benchmark
         #
-        overwrite_files_bytes_size = sum(s[0] for s in threads_results.values())
+        #
+        if not options.writeonly:
+            print("\n--- INITIALIZING FILE LINEAR READ BENCHMARK...\n", file=sys.stderr)
+        
+            linear_read_time, threads_results = \
+                run_benchmark(pool, file_linear_read_benchmark, \
+                              file_sizes, \
+                              threadcount, blocksize, \
+                              time_bounded=True)
 
-        print("", file=sys.stderr)
-        print("--- WRITTE " + str(filecount) + " FILES WITH TOTAL SIZE" \
-            + str(humanize.naturalsize(overwrite_files_bytes_size)) + " IN " \
-            + str(overwrite_files_time) + "s", file=sys.stderr)
-        print("--- THROUGHPUT: " \
-            + str(humanize.naturalsize(\
-                                overwrite_files_bytes_size/overwrite_files_time)) \
-            + "/s", file=sys.stderr)
-        print("", file=sys.stderr)
+            #
+            # Calculate total benchmark size and time
+            #
+            linear_read_bytes_size = sum(s[0] for s in threads_results)
+            linear_read_files_count = sum(s[4] for s in threads_results)
+            linear_read_latency = merge_latency_histograms(threads_results)
+            phase_latencies["LINEAR READ"] = linear_read_latency['read']
+            phase_page_faults["LINEAR READ"] = merge_page_faults(threads_results)
+
+            print("", file=sys.stderr)
+            print("--- READ " + str(linear_read_files_count) + " FILES WITH TOTAL SIZE " \
+                  + str(humanize.naturalsize(linear_read_bytes_size)) + " IN " \
+                  + str(linear_read_time) + "s", file=sys.stderr)
+            print("--- THROUGHPUT: " \
+                  + str(humanize.naturalsize(linear_read_bytes_size/linear_read_time)) \
+                  + "/s", file=sys.stderr)
+            if options.verify:
+                print(format_verify_summary(linear_read_latency, \
+                                            linear_read_bytes_size, \
+                                            pool.threadcount), \
+                      file=sys.stderr)
+            print(format_latency_summary(linear_read_latency), file=sys.stderr)
+            print(format_page_faults_summary(phase_page_faults["LINEAR READ"]), \
+                  file=sys.stderr)
+            phase_cpu["LINEAR READ"] = (merge_cpu_usage(threads_results), \
+                linear_read_bytes_size, phase_latencies["LINEAR READ"].total_count())
+            print(format_cpu_summary(*phase_cpu["LINEAR READ"]), file=sys.stderr)
+            if "LINEAR READ" in harness_ceilings:
+                print(format_harness_load(harness_ceilings["LINEAR READ"], \
+                          phase_cpu["LINEAR READ"][2] / linear_read_time / nodecount), \
+                      file=sys.stderr)
+            print(format_task_skew_summary(threads_results), file=sys.stderr)
+            print("", file=sys.stderr)
+
+            if options.hotcache:
+                run_warm_read_benchmark(pool, file_linear_read_benchmark, file_sizes, \
+                                        threadcount, blocksize, \
+                                        linear_read_bytes_size / linear_read_time)
         
-        if dropcaches:
-            print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
-            drop_caches()
-            print(" DONE", file=sys.stderr)
+            if dropcaches:
+                print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
+                evict_caches(pool, filecount)
+                print(" DONE", file=sys.stderr)
+
 
         ##########
         #
-        # Start file overwrite benchmark
+        # Start random read benchmark
         #
         #
-        threads = []
-        threads_results = process_manager.dict()
-        threads_progress_messages = process_manager.dict()
-        print("\n--- INITIALIZING FILE WRITE BENCHMARK...\n", file=sys.stderr)
+        if not options.writeonly:
+            print("\n--- INITIALIZING FILE RANDOM READ BENCHMARK...\n", file=sys.stderr)
         
-        overwrite_files_time = run_benchmark(file_write_benchmark, \
-                                            filecount, threadcount, deviation, \
-                                            blocksize, threads_results, \
-                                            threads_progress_messages)
+            random_read_time, threads_results = \
+                run_benchmark(pool, file_random_read_benchmark, \
+                              file_sizes, \
+                              threadcount, blocksize, \
+                              time_bounded=True)
+
+            #
+            # Calculate total benchmark size and time
+            #
+            random_read_bytes_size = sum(s[0] for s in threads_results)
+            random_read_files_count = sum(s[4] for s in threads_results)
+            random_read_latency = merge_latency_histograms(threads_results)
+            phase_latencies["RANDOM READ"] = random_read_latency['read']
+            phase_page_faults["RANDOM READ"] = merge_page_faults(threads_results)
+
+            print("", file=sys.stderr)
+            print("--- READ " + str(random_read_files_count) + " FILES WITH TOTAL SIZE " \
+                  + str(humanize.naturalsize(random_read_bytes_size)) + " IN " \
+                  + str(random_read_time) + "s", file=sys.stderr)
+            print("--- THROUGHPUT: " \
+                  + str(humanize.naturalsize(random_read_bytes_size/random_read_time)) \
+                  + "/s", file=sys.stderr)
+            if options.verify:
+                print(format_verify_summary(random_read_latency, \
+                                            random_read_bytes_size, \
+                                            pool.threadcount), \
+                      file=sys.stderr)
+            print(format_latency_summary(random_read_latency), file=sys.stderr)
+            print(format_page_faults_summary(phase_page_faults["RANDOM READ"]), \
+                  file=sys.stderr)
+            phase_cpu["RANDOM READ"] = (merge_cpu_usage(threads_results), \
+                random_read_bytes_size, phase_latencies["RANDOM READ"].total_count())
+            print(format_cpu_summary(*phase_cpu["RANDOM READ"]), file=sys.stderr)
+            if "RANDOM READ" in harness_ceilings:
+                print(format_harness_load(harness_ceilings["RANDOM READ"], \
+                          phase_cpu["RANDOM READ"][2] / random_read_time / nodecount), \
+                      file=sys.stderr)
+            print(format_task_skew_summary(threads_results), file=sys.stderr)
+            print("", file=sys.stderr)
+
+            if options.hotcache:
+                run_warm_read_benchmark(pool, file_random_read_benchmark, file_sizes, \
+                                        threadcount, blocksize, \
+                                        random_read_bytes_size / random_read_time)
+
+            if dropcaches:
+                print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
+                evict_caches(pool, filecount)
+                print(" DONE", file=sys.stderr)
 
+        ##########
         #
-        # Calculate total benchmark size and time
+        # Start mixed read/write benchmark
         #
-        overwrite_files_bytes_size = sum(s[0] for s in threads_results.values())
-
-        print("", file=sys.stderr)
-        print("--- OVERWRITTEN " + str(filecount) + " FILES WITH TOTAL SIZE" \
-            + str(humanize.naturalsize(overwrite_files_bytes_size)) + " IN " \
-            + str(overwrite_files_time) + "s", file=sys.stderr)
-        print("--- THROUGHPUT: " \
-            + str(humanize.naturalsize(\
-                                overwrite_files_bytes_size/overwrite_files_time)) \
-            + "/s", file=sys.stderr)
-        print("", file=sys.stderr)
-        
-        if dropcaches:
-            print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
-            drop_caches()
-            print(" DONE", file=sys.stderr)
+        #
+        if options.mixed and not options.readonly and not options.writeonly:
+            print("\n--- INITIALIZING MIXED READ/WRITE BENCHMARK...\n", \
+                  file=sys.stderr)
 
+            mixed_time, threads_results = \
+                run_benchmark(pool, file_mixed_benchmark, file_sizes, \
+                              threadcount, blocksize, \
+                              filecount=mixed_batch_count(file_sizes, \
+                                                          blocksize), \
+                              time_bounded=True)
 
-    ##########
-    #
-    # Start linear read benchmark
-    #
-    #
-    if not options.writeonly:
-        threads = []
-        threads_results = process_manager.dict()
-        threads_progress_messages = process_manager.dict()
-        print("\n--- INITIALIZING FILE LINEAR READ BENCHMARK...\n", file=sys.stderr)
-        
-        linear_read_time = run_benchmark(file_linear_read_benchmark, \
-                                             filecount, threadcount, deviation, \
-                                             blocksize, threads_results, \
-                                             threads_progress_messages)
+            #
+            # Calculate total benchmark size and time
+            #
+            mixed_bytes_size = sum(s[0] for s in threads_results)
+            mixed_latency = merge_latency_histograms(threads_results)
+            phase_latencies["MIXED READ"] = mixed_latency['read']
+            phase_latencies["MIXED WRITE"] = mixed_latency['write']
+            phase_page_faults["MIXED"] = merge_page_faults(threads_results)
+            mixed_reads = mixed_latency['read'].total_count()
+            mixed_writes = mixed_latency['write'].total_count()
+
+            print("", file=sys.stderr)
+            print("--- MIXED: " + str(mixed_reads) + " READS AND " \
+                  + str(mixed_writes) + " WRITES OF TOTAL SIZE " \
+                  + str(humanize.naturalsize(mixed_bytes_size)) + " IN " \
+                  + str(mixed_time) + "s", file=sys.stderr)
+            print("--- THROUGHPUT: " \
+                  + str(humanize.naturalsize(mixed_bytes_size/mixed_time)) \
+                  + "/s, %.1f ops/s" % ((mixed_reads + mixed_writes) \
+                                         / mixed_time), file=sys.stderr)
+            print(format_latency_summary(mixed_latency), file=sys.stderr)
+            print(format_page_faults_summary(phase_page_faults["MIXED"]), \
+                  file=sys.stderr)
+            phase_cpu["MIXED"] = (merge_cpu_usage(threads_results), \
+                mixed_bytes_size, mixed_reads + mixed_writes)
+            print(format_cpu_summary(*phase_cpu["MIXED"]), file=sys.stderr)
+            if "MIXED" in harness_ceilings:
+                print(format_harness_load(harness_ceilings["MIXED"], \
+                          phase_cpu["MIXED"][2] / mixed_time / nodecount), \
+                      file=sys.stderr)
+            print(format_task_skew_summary(threads_results), file=sys.stderr)
+            print("", file=sys.stderr)
+
+            if dropcaches:
+                print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
+                evict_caches(pool, filecount)
+                print(" DONE", file=sys.stderr)
 
+        ##########
+        #
+        # Run the random read benchmark at each target rate of the sweep
         #
-        # Calculate total benchmark size and time
         #
-        linear_read_bytes_size = sum(s[0] for s in threads_results.values())
+        if sweep_rates and not options.writeonly \
+                and iteration == options.repeat - 1:
+            run_rate_sweep(pool, sweep_rates, rate_divisor, file_sizes, \
+                           threadcount, blocksize, dropcaches)
+            pool.call(set_task_rate, target_rate / rate_divisor)
 
-        print("", file=sys.stderr)
-        print("--- READ " + str(filecount) + " FILES WITH TOTAL SIZE " \
-              + str(humanize.naturalsize(linear_read_bytes_size)) + " IN " \
-              + str(linear_read_time) + "s", file=sys.stderr)
-        print("--- THROUGHPUT: " \
-              + str(humanize.naturalsize(linear_read_bytes_size/linear_read_time)) \
-              + "/s", file=sys.stderr)
-        print("", file=sys.stderr)
-        
-        if dropcaches:
-            print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
-            drop_caches()
-            print(" DONE", file=sys.stderr)
+        ##########
+        #
+        # Run the read benchmarks for each block size and number of workers
+        # of the scaling sweep
+        #
+        #
+        if sweep_blocksizes and not options.writeonly \
+                and iteration == options.repeat - 1:
+            run_scaling_sweep(pool, sweep_blocksizes, sweep_workercounts, \
+                              file_sizes, dropcaches, \
+                              options.sweeprewrite and not options.readonly)
 
+        ##########
+        #
+        # Start metadata benchmark
+        #
+        #
+        if not options.readonly and options.mdfilecount > 0:
+            print("\n--- INITIALIZING METADATA BENCHMARK...\n", file=sys.stderr)
+
+            pool.call(os.mkdir, __test_data_dir + "/" + metadata_dir_name)
+            if directory_layout.has_directories():
+                create_directory_tree(pool, threadcount, metadata_dir_name)
+
+            for operation in metadata_operations:
+                metadata_time, threads_results = \
+                    run_benchmark(pool, \
+                                  partial(file_metadata_benchmark, operation), \
+                                  None, threadcount, blocksize, \
+                                  filecount=options.mdfilecount, numtype='normal')
+
+                metadata_latency = merge_latency_histograms(threads_results)
+                metadata_rates[operation] = options.mdfilecount * nodecount / metadata_time
+                phase_latencies["MD " + operation.upper()] = \
+                                                    metadata_latency[operation]
+
+                print("", file=sys.stderr)
+                print("--- METADATA " + operation.upper() + ": " \
+                    + str(options.mdfilecount * nodecount) + " FILES IN " \
+                    + str(metadata_time) + "s, " \
+                    + "%.1f ops/s" % metadata_rates[operation], file=sys.stderr)
+                print(format_latency_summary(metadata_latency), file=sys.stderr)
+                print(format_cpu_summary(merge_cpu_usage(threads_results), 0, \
+                                         options.mdfilecount * nodecount), \
+                      file=sys.stderr)
+                print(format_task_skew_summary(threads_results), file=sys.stderr)
+                print("", file=sys.stderr)
+
+            if directory_layout.has_directories():
+                remove_directory_tree(pool, threadcount, metadata_dir_name)
+            pool.call(os.rmdir, __test_data_dir + "/" + metadata_dir_name)
 
-    ##########
-    #
-    # Start random read benchmark
-    #
-    #
-    if not options.writeonly:
-        threads = []
-        threads_results = process_manager.dict()
-        threads_progress_messages = process_manager.dict()
-        print("\n--- INITIALIZING FILE RANDOM READ BENCHMARK...\n", file=sys.stderr)
-        
-        random_read_time = run_benchmark(file_random_read_benchmark, \
-                                             filecount, threadcount, deviation, \
-                                             blocksize, threads_results, \
-                                             threads_progress_messages)
+        #
+        # Update generations of the files in the manifest of a dataset which
+        # is used again
+        #
+        if not options.readonly \
+                and (options.keep or iteration < options.repeat - 1):
+            pool.call(write_manifest, file_sizes)
 
+        ##########
+        #
+        # Delete all test files and the entire test folder
         #
-        # Calculate total benchmark size and time
         #
-        random_read_bytes_size = sum(s[0] for s in threads_results.values())
+        if not options.keep and iteration == options.repeat - 1:
+            print("\n--- INITIALIZING FILE DELETE BENCHMARK...\n", file=sys.stderr)
 
-        print("", file=sys.stderr)
-        print("--- READ " + str(filecount) + " FILES WITH TOTAL SIZE " \
-              + str(humanize.naturalsize(random_read_bytes_size)) + " IN " \
-              + str(random_read_time) + "s", file=sys.stderr)
-        print("--- THROUGHPUT: " \
-              + str(humanize.naturalsize(random_read_bytes_size/random_read_time)) \
-              + "/s", file=sys.stderr)
-        print("", file=sys.stderr)
+            delete_time, threads_results = \
+                run_benchmark(pool, file_delete_benchmark, None, \
+                              threadcount, blocksize, \
+                              filecount=filecount, numtype='normal')
 
-        if dropcaches:
-            print("\n--- DROPPING FILE CACHE...", end="", file=sys.stderr)
-            drop_caches()
-            print(" DONE", file=sys.stderr)
+            delete_latency = merge_latency_histograms(threads_results)
+            delete_rate = filecount * nodecount / delete_time
+
+            #
+            # Remove the directory tree, the time is added to the delete time
+            #
+            if directory_layout.has_directories():
+                tree_delete_time, tree_delete_latency = \
+                    remove_directory_tree(pool, threadcount)
+                delete_time += tree_delete_time
+                delete_latency.update(tree_delete_latency)
+            pool.call(remove_test_data_dir)
+
+            phase_latencies["DELETE"] = delete_latency['unlink']
+            phase_page_faults["DELETE"] = merge_page_faults(threads_results)
+            phase_cpu["DELETE"] = (merge_cpu_usage(threads_results), 0, \
+                                   filecount * nodecount)
+
+            print("", file=sys.stderr)
+            print("--- DELETED " + str(filecount * nodecount) + " FILES IN " \
+                + str(delete_time) + "s", file=sys.stderr)
+            print("--- UNLINK RATE: %.1f ops/s" % delete_rate, file=sys.stderr)
+            print(format_latency_summary(delete_latency), file=sys.stderr)
+            print(format_cpu_summary(*phase_cpu["DELETE"]), file=sys.stderr)
+            print(format_task_skew_summary(threads_results), file=sys.stderr)
+            print("", file=sys.stderr)
+
+        iteration_metrics.append(\
+            iteration_summary_metrics(\
+                [("CREATE", create_files_time, create_files_bytes_size),
+                 ("RANDOM WRITE", random_write_time, random_write_bytes_size),
+                 ("WRITE", overwrite_files_time, overwrite_files_bytes_size),
+                 ("LINEAR READ", linear_read_time, linear_read_bytes_size),
+                 ("RANDOM READ", random_read_time, random_read_bytes_size),
+                 ("MIXED", mixed_time, mixed_bytes_size)],
+                phase_latencies, metadata_rates))
+
+        print(file=sys.stderr)
+        print(file=sys.stderr)
 
+        #
+        # Print CSV on stdout
+        #
+        if options.csv:
+            if not options.skipheader and iteration == 0:
+                print(storage_name_label + ";" \
+                      + number_files_label + ";" \
+                      + average_file_size_label + ";" \
+                      + create_files_label + ";" \
+                      + create_files_size_label + ";" \
+                      + overwrite_files_label + ";" \
+                      + overwrite_files_size_label + ";"\
+                      + linear_read_label + ";" \
+                      + linear_read_size_label + ";"\
+                      + random_read_label + ";" \
+                      + random_read_size_label + ";"\
+                      + delete_label + ";" \
+                      + ";".join(latency_csv_labels()) + ";" \
+                      + ";".join(page_faults_csv_labels()) + ";" \
+                      + ";".join(metadata_csv_labels()) + ";" \
+                      + tree_create_label + ";" \
+                      + delete_rate_label + ";" \
+                      + iteration_label + ";" \
+                      + mixed_label + ";" \
+                      + mixed_size_label + ";" \
+                      + ";".join(cpu_csv_labels()) + ";" \
+                      + random_write_label + ";" \
+                      + random_write_size_label)
+
+            print(options.name + ";" \
+                  + str(filecount) + ';' \
+                  + str(filesize) + ';' \
+                  + str(create_files_time) + ';' \
+                  + str(create_files_bytes_size) + ';' \
+                  + str(overwrite_files_time) + ';' \
+                  + str(overwrite_files_bytes_size) + ';' \
+                  + str(linear_read_time) + ';' \
+                  + str(linear_read_bytes_size) + ';' \
+                  + str(random_read_time) + ';' \
+                  + str(random_read_bytes_size) + ';' \
+                  + str(delete_time) + ';' \
+                  + ";".join(";".join(latency_csv_values(phase_latencies.get(p))) \
+                             for p in latency_phase_labels) + ';' \
+                  + ";".join(";".join(str(f) for f in \
+                                      phase_page_faults.get(p, (float('NaN'),)*2)) \
+                             for p in page_faults_phase_labels) + ';' \
+                  + ";".join(str(metadata_rates.get(op, float('NaN'))) \
+                             for op in metadata_operations) + ';' \
+                  + str(tree_create_time) + ';' \
+                  + str(delete_rate) + ';' \
+                  + str(iteration + 1) + ';' \
+                  + str(mixed_time) + ';' \
+                  + str(mixed_bytes_size) + ';' \
+                  + ";".join(";".join(cpu_csv_values(*phase_cpu.get(p, (None, 0, 0)))) \
+                             for p in page_faults_phase_labels) + ';' \
+                  + str(random_write_time) + ';' \
+                  + str(random_write_bytes_size))
+
+    pool.close()
 
     #
-    # Delete the entire test folder
-    #
-    if not options.keep:
-        print("\n--- CLEANING UP...", end="", file=sys.stderr)
-        starttime = time.time()
-        system("rm -rf naive-bench-data")
-        delete_time = time.time() - starttime
-        print("DONE [%d s]"%(delete_time), file=sys.stderr)
-
-    print(file=sys.stderr)
-    print(file=sys.stderr)
-
-    #
-    # Print CSV on stdout
-    #
-    if options.csv:
-        if not options.skipheader:
-            print(storage_name_label + ";" \
-                  + number_files_label + ";" \
-                  + average_file_size_label + ";" \
-                  + create_files_label + ";" \
-                  + create_files_size_label + ";" \
-                  + overwrite_files_label + ";" \
-                  + overwrite_files_size_label + ";"\
-                  + linear_read_label + ";" \
-                  + linear_read_size_label + ";"\
-                  + random_read_label + ";" \
-                  + random_read_size_label + ";"\
-                  + delete_label)
-
-        print(options.name + ";" \
-              + str(filecount) + ';' \
-              + str(filesize) + ';' \
-              + str(create_files_time) + ';' \
-              + str(create_files_bytes_size) + ';' \
-              + str(overwrite_files_time) + ';' \
-              + str(overwrite_files_bytes_size) + ';' \
-              + str(linear_read_time) + ';' \
-              + str(linear_read_bytes_size) + ';' \
-              + str(random_read_time) + ';' \
-              + str(random_read_bytes_size) + ';' \
-              + str(delete_time))
+    # Print statistics of all iterations
+    #
+    if options.repeat > 1:
+        print("--- SUMMARY OF " + str(options.repeat) + " ITERATIONS", \
+              file=sys.stderr)
+        print(format_repeat_summary(iteration_metrics), file=sys.stderr)
+        print(file=sys.stderr)
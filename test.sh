@@ -7,10 +7,17 @@
   [[ $output == *"Blocksize must not be larger than filesize - exiting"* ]]
 }
 
-@test "File count must be multiple of thread count" {
-  run ./naive-bench.py -P --filecount 10 --filesize 20MB --blocksize 100KB  -t 3 2>&1
+@test "File count does not have to be multiple of thread count" {
+  run ./naive-bench.py -P --filecount 10 --filesize 20MB --blocksize 100KB  -t 3 -k 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- TASK SKEW: "*" files per task, finished in "* ]]
+  [ "$(ls -la naive-bench-data | grep 20000000 | wc -l)" -eq "10" ]
+}
+
+@test "Thread count must not be larger than file count" {
+  run ./naive-bench.py -P --filecount 2 --filesize 20MB --blocksize 100KB  -t 3 2>&1
   [ $status -eq 2 ]
-  [[ $output == *"Total file count must be a multiple of thread count - exiting."* ]]
+  [[ $output == *"Thread count must not be larger than file count - exiting."* ]]
 }
 
 @test "CSV should be produced on the output" {
@@ -40,7 +47,219 @@
   [ "$(ls -la naive-bench-data | grep 20000000 | wc -l)" -eq "10" ]
 }
 
+@test "CSV should contain latency percentiles for each phase" {
+  run ./naive-bench.py -P --filecount 10 --filesize 20MB --blocksize 100KB  -t 2 -c -n latencies
+  [ $status -eq 0 ]
+  [[ $output == *"DELETE;CREATE P50 [us];CREATE P90 [us];CREATE P99 [us];CREATE P99.9 [us];CREATE MAX [us];RANDOM WRITE P50 [us]"*";RANDOM WRITE MAX [us];WRITE P50 [us]"* ]]
+  [[ $output == *"RANDOM READ P99.9 [us];RANDOM READ MAX [us]"* ]]
+  column=$(echo "$output" | grep "^STORAGE NAME;" | tr ';' '\n' | grep -n -x "RANDOM WRITE P50 \[us\]" | cut -d: -f1)
+  [ "$(echo "$output" | grep "^latencies;" | cut -d';' -f$column)" != "nan" ]
+}
+
+@test "Direct I/O requires page aligned blocksize" {
+  run ./naive-bench.py --direct --filecount 10 --filesize 20MB --blocksize 100KB  -t 2 2>&1
+  [ $status -eq 2 ]
+  [[ $output == *"for direct I/O - exiting."* ]]
+}
+
+@test "Direct I/O should create files with unaligned sizes" {
+  run ./naive-bench.py --direct --filecount 10 --filesize 20MB --blocksize 64KiB  -t 2 -k
+  [ $status -eq 0 ]
+  [ "$(ls -la naive-bench-data | grep 20000000 | wc -l)" -eq "10" ]
+}
+
+@test "Sync latency should be reported with sync option" {
+  run ./naive-bench.py -P --filecount 10 --filesize 20MB --blocksize 1MB  -t 2 --sync file --sync-method fdatasync 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"LATENCY SYNC [us]"*"(10 ops)"* ]]
+}
+
+@test "Mmap engine should create files with specified size" {
+  run ./naive-bench.py -P --filecount 10 --filesize 20MB --blocksize 90KB  -t 2 -k --engine mmap --madvise sequential 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"PAGE FAULTS:"* ]]
+  [ "$(ls -la naive-bench-data | grep 20000000 | wc -l)" -eq "10" ]
+}
+
+@test "Thread workers with I/O depth should create files with specified size" {
+  run ./naive-bench.py -P --filecount 10 --filesize 20MB --blocksize 90KB  -t 2 -k --worker-type thread --iodepth 4 2>&1
+  [ $status -eq 0 ]
+  [ "$(ls -la naive-bench-data | grep 20000000 | wc -l)" -eq "10" ]
+}
+
+@test "Sync after each block cannot be used with I/O depth" {
+  run ./naive-bench.py --filecount 10 --filesize 20MB --blocksize 1MB  -t 2 --sync block --iodepth 4 2>&1
+  [ $status -eq 2 ]
+  [[ $output == *"than 1 - exiting."* ]]
+}
+
+@test "Metadata benchmark should report rate of each operation" {
+  run ./naive-bench.py -P --filecount 10 --filesize 20MB --blocksize 1MB  -t 3 --metadata-files 100 -c 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- METADATA CREATE: 100 FILES IN"*"--- LATENCY CREATE [us]"*"(100 ops)"* ]]
+  [[ $output == *"--- METADATA UNLINK: 100 FILES IN"*"ops/s"* ]]
+  [[ $output == *"MD RENAME [ops/s];MD UTIME [ops/s];MD UNLINK [ops/s]"* ]]
+}
+
+@test "Files should be created in private directory subtrees" {
+  run ./naive-bench.py -P --filecount 12 --filesize 1MB --blocksize 100KB  -t 2 -k --dir-depth 2 --dir-fanout 3 --dir-layout private 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- CREATED 18 LEAF DIRECTORIES IN"* ]]
+  [ -f naive-bench-data/t1/d0/d1/3 ]
+  [ "$(find naive-bench-data -type f -size 1000000c | wc -l)" -eq "12" ]
+}
+
+@test "Delete phase should remove all files and directories" {
+  run ./naive-bench.py -P --filecount 10 --filesize 1MB --blocksize 100KB  -t 3 --dir-depth 2 --dir-fanout 2 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- DELETED 10 FILES IN"*"--- UNLINK RATE: "*"--- LATENCY UNLINK [us]"*"(10 ops)"* ]]
+  [ ! -e naive-bench-data ]
+}
+
+@test "Time bounded phases should report throughput after warmup" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 --runtime 1 --warmup 0.5 --steady-state 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- MEASURED THROUGHPUT: "*"/s (excluding 0.5s warmup)"* ]]
+  [[ $output == *"--- STEADY STATE"* ]]
+}
+
+@test "Runtime should be enforced in the middle of large files" {
+  run ./naive-bench.py -P --filecount 2 --filesize 10MB --blocksize 100KB  -t 2 --rate 40 --rate-scope worker --runtime 0.5 -w --verify 2>&1
+  [ $status -eq 0 ]
+  [[ $output =~ "--- CREATED 2 FILES OF TOTAL SIZE 20.0 MB IN " ]]
+  [[ $output =~ "--- OVERWRITTEN 2 FILES WITH TOTAL SIZE"[0-9.]+" MB IN 0."[0-9]+"s" ]]
+}
+
+@test "Runtime should not limit file creation" {
+  run ./naive-bench.py -P --filecount 20 --filesize 10KB --blocksize 10KB  -t 2 --rate 50 --rate-scope worker --runtime 0.1 2>&1
+  [ $status -eq 0 ]
+  [[ $output =~ "--- CREATED 20 FILES OF TOTAL SIZE " ]]
+}
+
+@test "Repeated runs should report statistics of each phase" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 --repeat 3 -n repeated -c 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- SUMMARY OF 3 ITERATIONS"*"--- LINEAR READ THROUGHPUT [MB/s]: mean="*"95% CI=["* ]]
+  [ "$(echo "$output" | grep -c "^repeated;4;1000000;")" -eq "3" ]
+}
+
+@test "Mixed benchmark should report reads and writes" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 4KiB  -t 2 -k --mixed --read-ratio 50 --distribution zipf --mixed-blocksizes 4KiB:3,64KiB:1 --mixed-ops 2000 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- MIXED: "*" READS AND "*" WRITES OF TOTAL SIZE"* ]]
+  [[ $output == *"--- LATENCY WRITE [us]"* ]]
+  [ "$(ls -la naive-bench-data | grep 1000000 | wc -l)" -eq "4" ]
+}
+
+@test "Coordinator should aggregate results of agents" {
+  mkdir agent1 agent2
+  (cd agent1 && timeout 60 ../naive-bench.py --agent 17301 --agent-key secret >/dev/null 2>&1 &)
+  (cd agent2 && NAIVE_BENCH_AGENT_KEY=secret timeout 60 ../naive-bench.py --agent 127.0.0.1:17302 >/dev/null 2>&1 &)
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 -m 10 --agents 127.0.0.1:17301,127.0.0.1:17302 --agent-key secret 2>&1
+  rm -rf agent1 agent2
+  [ $status -eq 0 ]
+  [[ $output == *"--- CREATED 8 FILES OF TOTAL SIZE"* ]]
+  [[ $output == *"--- LATENCY OPEN [us]"*"(8 ops)"* ]]
+  [[ $output == *"--- METADATA CREATE: 20 FILES IN"* ]]
+}
+
+@test "Agent should require an authentication key" {
+  NAIVE_BENCH_AGENT_KEY= run ./naive-bench.py --agent 17303 2>&1
+  [ $status -eq 2 ]
+  [[ $output == *"Agent key must be given with --agent-key or NAIVE_BENCH_AGENT_KEY"* ]]
+}
+
+@test "Written data should be compressible with given ratio" {
+  run ./naive-bench.py -P --filecount 2 --filesize 1MB --blocksize 100KB  -t 2 -k --compress-ratio 4 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- GENERATED 32.0 MiB DATA POOL IN "*"(compression ratio 4.0, dedup ratio 1.0)"* ]]
+  [ "$(cat naive-bench-data/* | gzip -1 | wc -c)" -lt "1000000" ]
+}
 
+@test "Verify mode should check all blocks read" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 --iodepth 2 --verify 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- VERIFIED 40 BLOCKS, VERIFY THROUGHPUT: "*"--- LATENCY VERIFY [us]"* ]]
+}
 
+@test "Verify mode should handle mixed block sizes clipped at end of file" {
+  run ./naive-bench.py -P --filecount 4 --filesize 100KB --blocksize 4KiB  -t 2 --mixed --verify --mixed-blocksizes 4KiB:1,64KiB:1 --mixed-ops 20000 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- MIXED: "*"--- LATENCY VERIFY [us]"* ]]
+}
 
+@test "Incremental run should only create missing files" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 -k 2>&1
+  [ $status -eq 0 ]
+  [ -f naive-bench-data/.manifest ]
+  run ./naive-bench.py -P --filecount 6 --filesize 1MB --blocksize 100KB  -t 2 -k --incremental 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- REUSING 4 FILES OF THE DATASET MANIFEST"*"--- CREATED 2 FILES OF TOTAL SIZE"* ]]
+  run ./naive-bench.py -P --filecount 6 --filesize 1MB --blocksize 100KB  -t 2 -r 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- READ 6 FILES WITH TOTAL SIZE 6.0 MB"* ]]
+  [ ! -e naive-bench-data ]
+}
 
+@test "Verifying a dataset with a different block size should be refused" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 64KiB  -t 2 -w -k --verify 2>&1
+  [ $status -eq 0 ]
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 128KiB  -t 2 -r -k --verify 2>&1
+  [ $status -eq 2 ]
+  [[ $output == *"Dataset was verified with block size 65536, it cannot be verified with block size 131072 - exiting."* ]]
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 64KiB  -t 2 -r --verify 2>&1
+  [ $status -eq 0 ]
+}
+
+@test "Read-only run on a larger dataset should remove all files" {
+  run ./naive-bench.py -P --filecount 6 --filesize 1MB --blocksize 100KB  -t 2 -k 2>&1
+  [ $status -eq 0 ]
+  touch naive-bench-data/.manifest.tmp
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 -r 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- DELETED 4 FILES IN "* ]]
+  [ ! -e naive-bench-data ]
+}
+
+@test "Hot cache mode should report warm and cold throughput" {
+  run ./naive-bench.py --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 --evict fadvise --hot-cache 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- DROPPING FILE CACHE... DONE"* ]]
+  [ "$(echo "$output" | grep -c "^--- WARM CACHE THROUGHPUT: .*, COLD CACHE THROUGHPUT: ")" -eq "2" ]
+}
+
+@test "Rate sweep should report latency for each target rate" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 --rate 400 --rate-sweep 200,400 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- RANDOM READ LATENCY AGAINST TARGET RATE"*"--- RATE 200.0 ops/s: achieved "*"--- RATE 400.0 ops/s: achieved "* ]]
+}
+
+@test "Scaling sweep should report a matrix of block sizes and workers" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 --sweep-blocksizes 100KB,200KB --sweep-threads 1,2 --sweep-csv sweep.csv 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- SCALING SWEEP LINEAR READ THROUGHPUT"*"--- SCALING SWEEP RANDOM READ THROUGHPUT"* ]]
+  [ "$(grep -c "^.*;RANDOM READ;200000;" sweep.csv)" -eq "2" ]
+  [ "$(grep -c ";1$" sweep.csv)" -eq "4" ]
+  rm -f sweep.csv
+}
+
+@test "Each phase should report its CPU cost" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 --cpu-affinity 0 2>&1
+  [ $status -eq 0 ]
+  [ "$(echo "$output" | grep -c "^--- CPU: .*s user, .*s sys, .* CPU-s/GB, .* CPU-us/op, ")" -eq "5" ]
+}
+
+@test "Calibration should report harness ceiling of each phase" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 100KB  -t 2 --calibrate --profile profile 2>&1
+  [ $status -eq 0 ]
+  [[ $output == *"--- HARNESS CEILING CREATE: "*" ops/s, "*"--- HARNESS CEILING RANDOM READ: "* ]]
+  [ "$(echo "$output" | grep -c "^--- HARNESS CEILING: .* ops/s, .*% USED")" -eq "5" ]
+  [ -f profile/file_random_read_benchmark-1.prof ]
+  rm -rf profile
+}
+
+@test "Mixed benchmark should flush written files" {
+  run ./naive-bench.py -P --filecount 4 --filesize 1MB --blocksize 64KiB  -t 2 -x -S file 2>&1
+  [ $status -eq 0 ]
+  [ "$(echo "$output" | sed -n '/^--- MIXED: /,/^--- CPU: /p' | grep -c "^--- LATENCY SYNC \[us\]: ")" -eq "1" ]
+}